@@ -6,6 +6,7 @@ from app.config.supabase import init_supabase
 from app.routes.chat_routes import chat_bp
 from app.routes.sequences import bp as sequence_bp
 from app.tasks.email_queue_processor import email_queue_processor
+from app.tasks.vectorization_worker import vectorization_worker
 
 def create_app():
     load_dotenv()
@@ -35,6 +36,9 @@ def create_app():
     # Start email queue processor
     email_queue_processor.start()
 
+    # Start document vectorization worker
+    vectorization_worker.start()
+
     # Register blueprints
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(sequence_bp, url_prefix='/api')
@@ -1,5 +1,10 @@
-from supabase import create_client, Client
+from supabase import Client
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
 import os
+import threading
+import importlib.util
+import httpx
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,13 +15,61 @@ SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Supabase URL and Key must be set in environment variables")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Connection pool shared by every PostgREST request in the process
+SUPABASE_MAX_CONNECTIONS = int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20'))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv('SUPABASE_KEEPALIVE_SECONDS', '30'))
+# HTTP/2 needs the optional h2 package
+SUPABASE_HTTP2 = importlib.util.find_spec('h2') is not None
 
 # Database table names
 MESSAGES_TABLE = 'messages'
 SESSIONS_TABLE = 'sessions'
 SEQUENCES_TABLE = 'sequences'
 
+
+class PooledClient(Client):
+    """Supabase client whose PostgREST requests reuse one keep-alive pool.
+
+    The stock client opens its PostgREST session with httpx defaults; this
+    one swaps in a session sized for the worker's concurrency, keeps idle
+    connections open and negotiates HTTP/2 when available, so connection and
+    TLS setup happen once rather than on the request path.
+    """
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT):
+        postgrest = Client._init_postgrest_client(rest_url, headers=headers, schema=schema, timeout=timeout)
+        default_session = postgrest.session
+        postgrest.session = httpx.Client(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=default_session.timeout,
+            follow_redirects=True,
+            http2=SUPABASE_HTTP2,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+                keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS
+            )
+        )
+        default_session.close()
+        return postgrest
+
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+def get_supabase_client() -> Client:
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PooledClient.create(SUPABASE_URL, SUPABASE_KEY)
+    return _client
+
+supabase: Client = get_supabase_client()
+
 def init_supabase():
     """Initialize Supabase database tables if they don't exist."""
     try:
@@ -24,4 +77,4 @@ def init_supabase():
         pass
     except Exception as e:
         print(f"Error initializing Supabase: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
@@ -1,7 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.services.gpt_service import gpt_service
 from app.services.message_service import message_service
+from app.services.response_cache import response_cache
+from app.services.sequence_cache import sequence_cache
 import uuid
+import json
 from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
@@ -46,7 +49,8 @@ def chat(session_id: str):
         response = gpt_service.chat_completion(
             session_id=session_id,
             message=message,
-            sequence_id=sequence_id
+            sequence_id=sequence_id,
+            folder_id=data.get('folderId')
         )
         
         return jsonify(response)
@@ -54,6 +58,55 @@ def chat(session_id: str):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@chat_bp.route('/<session_id>/async', methods=['POST'])
+async def chat_async(session_id: str):
+    try:
+        data = request.get_json()
+        
+        # Validate required fields
+        if not data or 'message' not in data:
+            return jsonify({"error": "Message is required"}), 400
+            
+        response = await gpt_service.chat_completion_async(
+            session_id=session_id,
+            message=data['message'],
+            sequence_id=data.get('sequenceId'),
+            folder_id=data.get('folderId')
+        )
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@chat_bp.route('/<session_id>/stream', methods=['POST'])
+def chat_stream(session_id: str):
+    """Stream the chat response as Server-Sent Events."""
+    data = request.get_json()
+
+    # Validate required fields
+    if not data or 'message' not in data:
+        return jsonify({"error": "Message is required"}), 400
+
+    message = data['message']
+    sequence_id = data.get('sequenceId')
+    folder_id = data.get('folderId')
+
+    def generate():
+        for event in gpt_service.chat_completion_stream(
+            session_id=session_id,
+            message=message,
+            sequence_id=sequence_id,
+            folder_id=folder_id
+        ):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @chat_bp.route('/<session_id>/messages', methods=['GET'])
 def get_messages(session_id: str):
     try:
@@ -106,4 +159,8 @@ def format_messages():
         return jsonify({"messages": formatted_messages})
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@chat_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"response_cache": response_cache.stats(), "sequence_cache": sequence_cache.stats()})
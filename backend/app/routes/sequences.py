@@ -1,5 +1,8 @@
-from flask import Blueprint, request, jsonify
-from app.services.sequence_service import sequence_service, publish_sequence
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import json
+from app.services.sequence_service import sequence_service, publish_sequence, audience_size
+from app.services.recipient_store import validate_segment
+from app.services.suppression_index import suppression_index
 from app.services.gpt_service import gpt_service
 
 bp = Blueprint('sequences', __name__)
@@ -30,13 +33,19 @@ def create_sequence():
             for field in required_fields:
                 if field not in step:
                     return jsonify({"error": f"Step is missing required field: {field}"}), 400
+
+        try:
+            validate_segment(data.get('segment'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
             
         sequence = sequence_service.create_sequence(
             title=data['title'],
             description=data['description'],
             steps=data['steps'],
             metadata=data.get('metadata'),
-            status=data.get('status', 'DRAFT')
+            status=data.get('status', 'DRAFT'),
+            segment=data.get('segment')
         )
         
         return jsonify(sequence), 201
@@ -67,6 +76,12 @@ def update_sequence(sequence_id: str):
                 for field in required_fields:
                     if field not in step:
                         return jsonify({"error": f"Step is missing required field: {field}"}), 400
+
+        if 'segment' in data:
+            try:
+                validate_segment(data['segment'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
             
         sequence = sequence_service.update_sequence(sequence_id, data)
         return jsonify(sequence)
@@ -103,15 +118,20 @@ def list_sequences():
         active_only = request.args.get('active_only', default='true').lower() == 'true'
         status = request.args.get('status')
         
-        sequences = sequence_service.list_sequences(
+        page = sequence_service.list_sequences(
             limit=limit,
             offset=offset,
             active_only=active_only,
-            status=status
+            status=status,
+            cursor=request.args.get('cursor'),
+            summary=request.args.get('fields') == 'summary',
+            count=request.args.get('count')
         )
         
-        return jsonify({"sequences": sequences})
+        return jsonify(page)
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -128,6 +148,27 @@ def generate_sequence():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@bp.route('/sequences/generate/batch', methods=['POST'])
+def generate_sequences_batch():
+    """Generate sequences for many prompts, streaming NDJSON results as they complete."""
+    data = request.get_json()
+    if not data or not isinstance(data.get('prompts'), list) or not data['prompts']:
+        return jsonify({"error": "Prompts are required"}), 400
+    if not all(isinstance(prompt, str) and prompt.strip() for prompt in data['prompts']):
+        return jsonify({"error": "Each prompt must be a non-empty string"}), 400
+    max_concurrency = data.get('max_concurrency')
+    if max_concurrency is not None and (not isinstance(max_concurrency, int) or isinstance(max_concurrency, bool) or max_concurrency < 1):
+        return jsonify({"error": "max_concurrency must be a positive integer"}), 400
+
+    def generate():
+        for event in gpt_service.generate_sequences(
+            data['prompts'],
+            max_concurrency=max_concurrency
+        ):
+            yield json.dumps(event, default=str) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @bp.route('/sequences/<sequence_id>/edit', methods=['POST'])
 def edit_sequence_with_gpt(sequence_id: str):
     try:
@@ -146,6 +187,47 @@ def edit_sequence_with_gpt(sequence_id: str):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@bp.route('/sequences/<sequence_id>/patch', methods=['POST'])
+def patch_sequence(sequence_id: str):
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('operations'), list):
+            return jsonify({"error": "Operations are required"}), 400
+            
+        # Validate sequence exists
+        if not sequence_service.get_sequence(sequence_id):
+            return jsonify({"error": "Sequence not found"}), 404
+            
+        sequence = sequence_service.patch_sequence(sequence_id, data['operations'])
+        return jsonify(sequence)
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/sequences/audience/preview', methods=['POST'])
+def preview_audience():
+    """Count the recipients a segment definition would select."""
+    try:
+        data = request.get_json() or {}
+        return jsonify({"count": audience_size(data.get('segment'))})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/sequences/<sequence_id>/audience', methods=['GET'])
+def get_audience_size(sequence_id: str):
+    """Count the recipients a sequence would be published to."""
+    try:
+        sequence = sequence_service.get_sequence(sequence_id)
+        if not sequence:
+            return jsonify({"error": "Sequence not found"}), 404
+        return jsonify({"count": audience_size(sequence.get('segment'))})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @bp.route('/sequences/<sequence_id>/publish', methods=['POST'])
 def publish_sequence_route(sequence_id):
     """Publish a sequence and queue emails for all users."""
@@ -153,4 +235,16 @@ def publish_sequence_route(sequence_id):
         sequence = publish_sequence(sequence_id)
         return jsonify(sequence)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500 
+
+@bp.route('/suppressions', methods=['POST'])
+def suppress_email():
+    """Stop all current and future sends to an address."""
+    try:
+        data = request.get_json() or {}
+        if not data.get('email'):
+            return jsonify({"error": "Email is required"}), 400
+        suppression_index.suppress(data['email'], reason=data.get('reason', 'unsubscribed'))
+        return jsonify({"email": data['email'].strip().lower(), "suppressed": True})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
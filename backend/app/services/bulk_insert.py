@@ -0,0 +1,51 @@
+import time
+import uuid
+from itertools import islice
+from typing import Callable, Dict, Any, Iterable, Optional
+from app.config.supabase import supabase
+
+# Namespace for deterministic queue row ids, so retried chunks are idempotent
+QUEUE_ROW_NAMESPACE = uuid.UUID('5b0c3f4e-2a8f-4f5e-9a43-7c1f0f6f2d11')
+
+
+def queue_row_id(sequence_id: str, step_number: int, to_email: str) -> str:
+    """Build a stable id for one (sequence, step, recipient) queue row."""
+    return str(uuid.uuid5(QUEUE_ROW_NAMESPACE, f"{sequence_id}:{step_number}:{to_email.lower()}"))
+
+
+def insert_in_chunks(
+    table: str,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int = 500,
+    max_retries: int = 3,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> int:
+    """Insert rows from an iterable in bounded chunks and return the row count.
+
+    Rows are pulled lazily so only one chunk is held in memory at a time.
+    Each chunk is upserted with ``ignore_duplicates`` so a retry after a
+    partially applied request never creates duplicate rows, provided the
+    rows carry deterministic ids.
+    """
+    iterator = iter(rows)
+    total = 0
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+
+        for attempt in range(max_retries + 1):
+            try:
+                supabase.table(table).upsert(chunk, ignore_duplicates=True).execute()
+                break
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise Exception(f"Failed to insert chunk into {table} after {total} rows: {str(e)}")
+                delay = 0.5 * (2 ** attempt)
+                print(f"Chunk insert into {table} failed ({str(e)}), retrying in {delay}s")
+                time.sleep(delay)
+
+        total += len(chunk)
+        if on_progress:
+            on_progress(total)
+    return total
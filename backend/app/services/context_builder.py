@@ -0,0 +1,136 @@
+import os
+from typing import Dict, List, Any, Optional
+from app.services.message_service import message_service
+from app.utils.cache import TTLCache
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally, estimating ~4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most ``max_tokens`` tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens]) + '…'
+    return text[:max_tokens * 4] + '…'
+
+
+class ContextBuilder:
+    """Pack chat history into a token budget.
+
+    Recent messages are added newest first until the budget is spent; each
+    one is capped so a pasted sequence body cannot crowd out the rest.
+    Messages that no longer fit, and messages that have aged out of the
+    ``history_limit`` window, are folded once into a rolling per-session
+    summary, which is stored on the session and sent ahead of the history.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = 6000,
+        summary_tokens: int = 500,
+        max_message_tokens: int = 800,
+        summary_line_tokens: int = 60,
+        history_limit: int = 50
+    ):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_message_tokens = max_message_tokens
+        self.summary_line_tokens = summary_line_tokens
+        self.history_limit = history_limit
+        self._summaries = TTLCache(max_size=1000, ttl=1800)
+
+    def _get_summary(self, session_id: str) -> Dict[str, Optional[str]]:
+        state = self._summaries.get(session_id)
+        if state is None:
+            state = message_service.get_session_summary(session_id)
+            self._summaries.set(session_id, state)
+        return state
+
+    def _fold(self, state: Dict[str, Optional[str]], evicted: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Fold evicted messages (oldest first) into the rolling summary."""
+        lines = state['summary'].split('\n') if state.get('summary') else []
+        for msg in evicted:
+            lines.append(f"{msg.get('role', 'user')}: {truncate_tokens(msg.get('content', ''), self.summary_line_tokens)}")
+        # Keep the newest lines that fit the summary budget
+        while lines and count_tokens('\n'.join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return {'summary': '\n'.join(lines), 'summary_until': evicted[-1].get('created_at')}
+
+    def _aged_out(self, session_id: str, history: List[Dict[str, Any]], summary_until: Optional[str]) -> List[Dict[str, Any]]:
+        """Return messages older than the fetched window that the summary has not absorbed, oldest first.
+
+        Only the newest ``history_limit`` of them are read: older lines would
+        not survive the summary budget anyway.
+        """
+        if len(history) < self.history_limit:
+            return []
+        oldest = history[-1].get('created_at')
+        if not oldest or (summary_until and summary_until >= oldest):
+            return []
+        try:
+            return message_service.get_messages_before(session_id, oldest, after=summary_until, limit=self.history_limit)
+        except Exception as e:
+            print(f"Error loading messages to summarize: {str(e)}")
+            return []
+
+    def build(self, session_id: str, system_messages: List[Dict[str, Any]], user_message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return system messages, summary, packed history and the new user message."""
+        history = message_service.get_messages(session_id, limit=self.history_limit)
+        state = self._get_summary(session_id)
+
+        remaining = self.budget_tokens - self.summary_tokens - count_tokens(user_message.get('content', ''))
+        remaining -= sum(count_tokens(msg.get('content', '')) for msg in system_messages)
+
+        packed = []
+        evicted = []
+        for msg in history:
+            content = truncate_tokens(msg.get('content', ''), self.max_message_tokens)
+            tokens = count_tokens(content)
+            if not evicted and tokens <= remaining:
+                packed.append({"role": msg.get("role", "user"), "content": content})
+                remaining -= tokens
+            else:
+                evicted.append(msg)
+
+        # Only fold messages the summary has not already absorbed
+        summary_until = state.get('summary_until')
+        fresh = self._aged_out(session_id, history, summary_until)
+        fresh += [msg for msg in reversed(evicted) if not summary_until or (msg.get('created_at') or '') > summary_until]
+        if fresh:
+            state = self._fold(state, fresh)
+            self._summaries.set(session_id, state)
+            try:
+                message_service.update_session_summary(session_id, state['summary'], state['summary_until'])
+            except Exception as e:
+                print(f"Error saving session summary: {str(e)}")
+
+        messages = list(system_messages)
+        if state.get('summary'):
+            messages.append({
+                "role": "system",
+                "content": f"Summary of earlier conversation:\n{state['summary']}"
+            })
+        messages.extend(reversed(packed))
+        messages.append(user_message)
+        return messages
+
+# Create a singleton instance
+context_builder = ContextBuilder(
+    budget_tokens=int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '6000')),
+    summary_tokens=int(os.getenv('CHAT_SUMMARY_TOKEN_BUDGET', '500')),
+    max_message_tokens=int(os.getenv('CHAT_MAX_MESSAGE_TOKENS', '800'))
+)
@@ -0,0 +1,116 @@
+import os
+import json
+import threading
+from typing import Callable, Dict, List, Any
+from app.utils.cache import TTLCache, get_shared_backend
+
+Loader = Callable[[int], List[Dict[str, Any]]]
+
+
+class ConversationCache:
+    """Write-through cache of the most recent messages per session.
+
+    Each entry holds up to ``window`` messages, newest first, plus a
+    ``complete`` flag meaning the session has no older messages in the
+    database. ``MessageService.create_message`` appends to cached entries,
+    so reads after a write never need a round-trip. When a shared backend
+    is configured, entries live there as Redis lists so every worker sees
+    the same history.
+    """
+
+    def __init__(self, window: int = 50, max_sessions: int = 1000, ttl: float = 1800.0):
+        self.window = window
+        self.ttl = ttl
+        self._local = TTLCache(max_size=max_sessions, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"conversation:{session_id}"
+
+    def get_messages(self, session_id: str, limit: int, offset: int, loader: Loader) -> List[Dict[str, Any]]:
+        """Return ``limit`` messages after ``offset``, loading the window on a miss."""
+        end = offset + limit
+        if end > self.window:
+            # Older pages are outside the cached window
+            return loader(end)[offset:end]
+
+        backend = get_shared_backend()
+        if backend is not None:
+            key = self._key(session_id)
+            try:
+                cached = backend.lrange(key, 0, self.window - 1)
+                if len(cached) >= end or backend.exists(f"{key}:complete"):
+                    return [json.loads(item) for item in cached[offset:end]]
+            except Exception as e:
+                # The shared cache is unreachable; read straight from the database
+                print(f"Error reading conversation cache: {str(e)}")
+                return loader(end)[offset:end]
+        else:
+            entry = self._local.get(session_id)
+            if entry and (len(entry['messages']) >= end or entry['complete']):
+                return entry['messages'][offset:end]
+
+        messages = loader(self.window)
+        self._store(session_id, messages, complete=len(messages) < self.window)
+        return messages[offset:end]
+
+    def _store(self, session_id: str, messages: List[Dict[str, Any]], complete: bool) -> None:
+        backend = get_shared_backend()
+        if backend is None:
+            with self._lock:
+                self._local.set(session_id, {'messages': list(messages), 'complete': complete})
+            return
+
+        key = self._key(session_id)
+        try:
+            pipe = backend.pipeline()
+            pipe.delete(key, f"{key}:complete")
+            if messages:
+                pipe.rpush(key, *[json.dumps(message, default=str) for message in messages])
+                pipe.expire(key, int(self.ttl))
+            # An empty session is cached as just the complete flag
+            if complete:
+                pipe.set(f"{key}:complete", 1, ex=int(self.ttl))
+            pipe.execute()
+        except Exception as e:
+            print(f"Error writing conversation cache: {str(e)}")
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        """Add a newly written message to the session's entry, if cached."""
+        backend = get_shared_backend()
+        if backend is not None:
+            key = self._key(session_id)
+            try:
+                item = json.dumps(message, default=str)
+                length = backend.lpushx(key, item)
+                if not length and backend.exists(f"{key}:complete"):
+                    # First message of a session cached as empty
+                    length = backend.lpush(key, item)
+                if length > self.window:
+                    backend.ltrim(key, 0, self.window - 1)
+                    backend.delete(f"{key}:complete")
+                if length:
+                    backend.expire(key, int(self.ttl))
+            except Exception as e:
+                print(f"Error appending to conversation cache: {str(e)}")
+            return
+
+        # The user and assistant messages of a turn are appended concurrently
+        with self._lock:
+            entry = self._local.get(session_id)
+            if entry is None:
+                return
+            messages = [message] + entry['messages']
+            complete = entry['complete']
+            if len(messages) > self.window:
+                messages = messages[:self.window]
+                complete = False
+            self._local.set(session_id, {'messages': messages, 'complete': complete})
+
+# Create a singleton instance
+conversation_cache = ConversationCache(
+    window=int(os.getenv('CONVERSATION_CACHE_WINDOW', '50')),
+    max_sessions=int(os.getenv('CONVERSATION_CACHE_MAX_SESSIONS', '1000')),
+    ttl=float(os.getenv('CONVERSATION_CACHE_TTL_SECONDS', '1800'))
+)
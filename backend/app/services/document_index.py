@@ -0,0 +1,310 @@
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; folder syncs are then only serialized per process
+    fcntl = None
+from app.utils.supabase import get_supabase_client, get_folder_files, update_file_status
+
+VECTOR_INDEX_DIR = os.getenv(
+    'VECTOR_INDEX_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'vector_index')
+)
+
+# File types read as plain text; PDFs go through PyPDF2
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.json', '.html', '.htm')
+
+
+def extract_text(filename: str, data: bytes) -> str:
+    """Extract the text of an uploaded file."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.pdf':
+        from PyPDF2 import PdfReader
+        reader = PdfReader(io.BytesIO(data))
+        return '\n'.join(page.extract_text() or '' for page in reader.pages)
+    if extension in TEXT_EXTENSIONS:
+        return data.decode('utf-8', errors='ignore')
+    raise ValueError(f"Unsupported file type: {extension or filename}")
+
+
+def chunk_text(text: str, chunk_words: int = 200, overlap_words: int = 40) -> List[str]:
+    """Split text into overlapping windows of words."""
+    words = text.split()
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(' '.join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+class FolderIndex:
+    """Chunk embeddings of one folder with an inverted-file (IVF) partition.
+
+    Embeddings are normalized, so the dot product is the cosine similarity.
+    Once the folder holds ``ivf_min_size`` chunks they are clustered with
+    k-means and a query only scores the chunks of its ``nprobe`` nearest
+    clusters. New chunks join their nearest existing cluster; the clusters
+    are retrained when the index has doubled since they were built.
+    """
+
+    def __init__(self, ivf_min_size: int = 2000, nprobe: int = 8):
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.texts: List[str] = []
+        self.file_ids: List[str] = []
+        self.versions: Dict[str, str] = {}
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'FolderIndex':
+        index = cls(**kwargs)
+        if not os.path.exists(path):
+            return index
+        with np.load(path, allow_pickle=False) as data:
+            index.embeddings = data['embeddings']
+            index.texts = data['texts'].tolist()
+            index.file_ids = data['file_ids'].tolist()
+            index.versions = dict(zip(data['version_files'].tolist(), data['version_values'].tolist()))
+            index.centroids = data['centroids']
+            index.assignments = data['assignments']
+            index.trained_size = int(data['trained_size'])
+        return index
+
+    def save(self, path: str) -> None:
+        """Write the index atomically so readers never see a partial file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temporary file, so concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                f,
+                    embeddings=self.embeddings,
+                    texts=np.array(self.texts, dtype=str),
+                    file_ids=np.array(self.file_ids, dtype=str),
+                    version_files=np.array(list(self.versions), dtype=str),
+                    version_values=np.array(list(self.versions.values()), dtype=str),
+                    centroids=self.centroids,
+                    assignments=self.assignments,
+                    trained_size=np.array(self.trained_size)
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def remove_file(self, file_id: str) -> None:
+        keep = np.array([owner != file_id for owner in self.file_ids], dtype=bool)
+        if len(keep) and not keep.all():
+            self.embeddings = self.embeddings[keep]
+            self.texts = [text for text, kept in zip(self.texts, keep) if kept]
+            self.file_ids = [owner for owner, kept in zip(self.file_ids, keep) if kept]
+            if len(self.assignments):
+                self.assignments = self.assignments[keep]
+        self.versions.pop(file_id, None)
+
+    def add_file(self, file_id: str, version: str, texts: List[str], embeddings: np.ndarray) -> None:
+        """Replace a file's chunks with a new version."""
+        self.remove_file(file_id)
+        self.versions[file_id] = version
+        if not texts:
+            return
+        self.embeddings = embeddings if not len(self) else np.vstack([self.embeddings, embeddings])
+        self.texts.extend(texts)
+        self.file_ids.extend([file_id] * len(texts))
+        if len(self.centroids):
+            self.assignments = np.concatenate([self.assignments, self._nearest(embeddings)])
+
+    def _nearest(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def build(self, iterations: int = 10) -> None:
+        """Train the IVF clusters when the index is large enough or has doubled."""
+        size = len(self)
+        if size < self.ivf_min_size:
+            self.centroids = np.zeros((0, 0), dtype=np.float32)
+            self.assignments = np.zeros(0, dtype=np.int32)
+            self.trained_size = 0
+            return
+        if len(self.centroids) and size < 2 * self.trained_size:
+            return
+
+        clusters = min(1024, int(np.sqrt(size)))
+        rng = np.random.default_rng(0)
+        centroids = self.embeddings[rng.choice(size, clusters, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self.embeddings @ centroids.T, axis=1)
+            for cluster in range(clusters):
+                members = self.embeddings[assignments == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = self._nearest(self.embeddings)
+        self.trained_size = size
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the ``k`` chunks most similar to a normalized query vector."""
+        if not len(self):
+            return []
+        if len(self.centroids):
+            probes = np.argsort(self.centroids @ query)[-self.nprobe:]
+            candidates = np.flatnonzero(np.isin(self.assignments, probes))
+        else:
+            candidates = np.arange(len(self))
+        scores = self.embeddings[candidates] @ query
+        top = np.arange(len(scores)) if len(scores) <= k else np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [{
+            'text': self.texts[candidates[i]],
+            'file_id': self.file_ids[candidates[i]],
+            'score': float(scores[i])
+        } for i in top]
+
+
+class DocumentIndexService:
+    """Vectorizes folder files with a local CPU model and searches them.
+
+    Ingestion is incremental: each file's indexed version is its storage
+    path and size, and uploads are stored under their content hash, so a
+    sync re-embeds only new or changed files and drops deleted ones. Every
+    worker process runs syncs, so a folder's sync holds a lock file next
+    to its index and the next one starts from the saved result.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = VECTOR_INDEX_DIR,
+        model_name: str = 'all-MiniLM-L6-v2',
+        chunk_words: int = 200,
+        overlap_words: int = 40,
+        ivf_min_size: int = 2000
+    ):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.ivf_min_size = ivf_min_size
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # folder id -> (mtime of the saved file, index)
+        self._indexes: Dict[str, Tuple[Optional[float], FolderIndex]] = {}
+        self._folder_locks: Dict[str, threading.Lock] = {}
+
+    def _path(self, folder_id: str) -> str:
+        return os.path.join(self.index_dir, f"{folder_id}.npz")
+
+    def _folder_lock(self, folder_id: str) -> threading.Lock:
+        with self._lock:
+            return self._folder_locks.setdefault(folder_id, threading.Lock())
+
+    @contextmanager
+    def _syncing(self, folder_id: str):
+        """Hold the folder's lock across threads and, through a lock file, across processes."""
+        with self._folder_lock(folder_id):
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(f"{self._path(folder_id)}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _mtime(self, folder_id: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._path(folder_id))
+        except OSError:
+            return None
+
+    def _index(self, folder_id: str) -> FolderIndex:
+        """Return the folder's index, reloading it when another process saved a newer file."""
+        mtime = self._mtime(folder_id)
+        cached = self._indexes.get(folder_id)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, FolderIndex.load(self._path(folder_id), ivf_min_size=self.ivf_min_size))
+            self._indexes[folder_id] = cached
+        return cached[1]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into normalized float32 vectors."""
+        with self._encoder_lock:
+            if self._encoder is None:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(self.model_name, device='cpu')
+        return np.asarray(self._encoder.encode(texts, normalize_embeddings=True, batch_size=64), dtype=np.float32)
+
+    @staticmethod
+    def _version(file: Dict[str, Any]) -> str:
+        return f"{file.get('storage_path')}:{file.get('size')}"
+
+    def _vectorize(self, file: Dict[str, Any]):
+        data = get_supabase_client().storage.from_('files').download(file['storage_path'].lstrip('/'))
+        chunks = chunk_text(extract_text(file['filename'], data), self.chunk_words, self.overlap_words)
+        return chunks, self.embed(chunks) if chunks else None
+
+    def sync_folder(self, folder_id: str) -> Dict[str, int]:
+        """Bring a folder's index in line with its files and return counts per outcome."""
+        counts = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        with self._syncing(folder_id):
+            # Loaded under the lock, so a sync another worker just saved is built upon
+            index = FolderIndex.load(self._path(folder_id), ivf_min_size=self.ivf_min_size)
+            files = get_folder_files(folder_id) or []
+            current = {file['id'] for file in files}
+
+            for file_id in [file_id for file_id in index.versions if file_id not in current]:
+                index.remove_file(file_id)
+                counts['removed'] += 1
+
+            for file in files:
+                version = self._version(file)
+                if index.versions.get(file['id']) == version:
+                    if file.get('status') != 'vectorized':
+                        update_file_status(file['id'], 'vectorized')
+                    counts['unchanged'] += 1
+                    continue
+                try:
+                    chunks, embeddings = self._vectorize(file)
+                    index.add_file(file['id'], version, chunks, embeddings)
+                    update_file_status(file['id'], 'vectorized')
+                    counts['indexed'] += 1
+                except Exception as e:
+                    print(f"Error vectorizing file {file['id']}: {str(e)}")
+                    update_file_status(file['id'], 'error')
+                    counts['failed'] += 1
+
+            if counts['indexed'] or counts['removed']:
+                index.build()
+                index.save(self._path(folder_id))
+            self._indexes[folder_id] = (self._mtime(folder_id), index)
+        return counts
+
+    def search(self, folder_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the folder's ``k`` chunks most relevant to the query."""
+        index = self._index(folder_id)
+        if not len(index):
+            return []
+        return index.search(self.embed([query])[0], k)
+
+# Create a singleton instance
+document_index = DocumentIndexService(
+    model_name=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+    ivf_min_size=int(os.getenv('VECTOR_IVF_MIN_CHUNKS', '2000'))
+)
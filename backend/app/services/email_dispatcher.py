@@ -0,0 +1,124 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+# Result of an email this worker no longer owns; it is counted but never acknowledged
+SKIPPED = 'SKIPPED'
+
+
+class DomainRateLimiter:
+    """Token bucket rate limiter keyed by recipient domain."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}
+
+    def acquire(self, domain: str) -> None:
+        """Block until a send to the given domain is allowed."""
+        if self.per_minute <= 0:
+            return
+        rate = self.per_minute / 60.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(domain, [float(self.per_minute), now])
+                tokens = min(float(self.per_minute), tokens + (now - updated) * rate)
+                if tokens >= 1:
+                    self._buckets[domain] = [tokens - 1, now]
+                    return
+                self._buckets[domain] = [tokens, now]
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+
+
+class EmailDispatcher:
+    """Fan due emails out over a bounded worker pool.
+
+    Status changes are buffered per status and written back in bulk through
+    ``status_writer(status, ids)`` instead of one update per email. An
+    optional ``screen_fn`` is checked right before each send; when it returns
+    a status the email is not sent and is acknowledged with that status.
+    An optional ``lease_fn`` is called after rate limiting, immediately
+    before the send; when it returns False the email is skipped.
+    """
+
+    def __init__(
+        self,
+        send_fn: Callable[[Dict[str, Any]], bool],
+        status_writer: Callable[[str, List[str]], None],
+        concurrency: int = 8,
+        domain_rate_per_minute: int = 0,
+        status_batch_size: int = 200,
+        screen_fn: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+        lease_fn: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ):
+        self.send_fn = send_fn
+        self.status_writer = status_writer
+        self.concurrency = max(1, concurrency)
+        self.status_batch_size = status_batch_size
+        self.screen_fn = screen_fn
+        self.lease_fn = lease_fn
+        self._rate_limiter = DomainRateLimiter(domain_rate_per_minute)
+
+    @staticmethod
+    def _domain(email: Dict[str, Any]) -> str:
+        return (email.get('to_email') or '').rpartition('@')[2].lower()
+
+    def _send(self, email: Dict[str, Any]) -> str:
+        try:
+            if self.screen_fn:
+                status = self.screen_fn(email)
+                if status:
+                    return status
+            self._rate_limiter.acquire(self._domain(email))
+            if self.lease_fn and not self.lease_fn(email):
+                return SKIPPED
+            return 'SENT' if self.send_fn(email) else 'FAILED'
+        except Exception as e:
+            print(f"Error dispatching email {email.get('id')}: {str(e)}")
+            return 'FAILED'
+
+    def _flush(self, pending: Dict[str, List[str]], status: str) -> None:
+        ids = pending.pop(status, [])
+        if not ids:
+            return
+        try:
+            self.status_writer(status, ids)
+        except Exception as e:
+            print(f"Error writing {status} status for {len(ids)} emails: {str(e)}")
+
+    def dispatch(self, emails: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Send every email and return a count per resulting status."""
+        counts: Dict[str, int] = {}
+        pending: Dict[str, List[str]] = {}
+        lock = threading.Lock()
+        # Bound in-flight work so a large iterable is never fully materialized
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        def on_done(email_id, future):
+            status = future.result()
+            flush = False
+            with lock:
+                counts[status] = counts.get(status, 0) + 1
+                if status != SKIPPED:
+                    pending.setdefault(status, []).append(email_id)
+                if status != SKIPPED and len(pending[status]) >= self.status_batch_size:
+                    batch = {status: pending.pop(status)}
+                    flush = True
+            if flush:
+                self._flush(batch, status)
+            slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for email in emails:
+                    slots.acquire()
+                    future = executor.submit(self._send, email)
+                    future.add_done_callback(lambda f, email_id=email['id']: on_done(email_id, f))
+        finally:
+            # Always acknowledge what was sent, even if the email source failed
+            for status in list(pending):
+                self._flush(pending, status)
+        return counts
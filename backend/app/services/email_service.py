@@ -1,10 +1,24 @@
 import os
 import smtplib
+import socket
+import threading
+import uuid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Callable, Iterator, Tuple
 from app.config.supabase import supabase
+from app.services.smtp_pool import SMTPConnectionPool
+from app.services.email_dispatcher import EmailDispatcher
+from app.services.step_template_service import step_template_service
+from app.services.suppression_index import suppression_index, SUPPRESSED, PAUSED
+from app.utils.templates import render
+
+# Columns needed to send a queued email
+SEND_COLUMNS = (
+    'id', 'sequence_id', 'step_number', 'to_email', 'subject', 'content',
+    'template_version', 'template_vars', 'scheduled_time', 'schedule_next'
+)
 
 class EmailService:
     def __init__(self):
@@ -15,6 +29,56 @@ class EmailService:
             'smtp_password': os.getenv('SMTP_PASSWORD'),
             'from_name': os.getenv('SMTP_FROM_NAME'),
         }
+        self._pool = SMTPConnectionPool(
+            self._settings,
+            max_size=int(os.getenv('SMTP_POOL_SIZE', '4')),
+            max_messages_per_connection=int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100')),
+            idle_timeout=float(os.getenv('SMTP_IDLE_TIMEOUT_SECONDS', '60'))
+        )
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = int(os.getenv('EMAIL_LEASE_SECONDS', '300'))
+        self.claim_batch_size = int(os.getenv('EMAIL_CLAIM_BATCH_SIZE', '100'))
+        self._queue_listeners: List[Callable[[datetime], None]] = []
+        self._sent_listeners: List[Callable[[List[Tuple[Dict[str, Any], datetime]]], None]] = []
+        self._sent_lock = threading.Lock()
+        self._sent: List[Tuple[Dict[str, Any], datetime]] = []
+        self._dispatcher = EmailDispatcher(
+            send_fn=self._send_queued_email,
+            status_writer=self._write_statuses,
+            concurrency=int(os.getenv('EMAIL_DISPATCH_CONCURRENCY', os.getenv('SMTP_POOL_SIZE', '4'))),
+            domain_rate_per_minute=int(os.getenv('EMAIL_DOMAIN_RATE_PER_MINUTE', '0')),
+            status_batch_size=int(os.getenv('EMAIL_STATUS_BATCH_SIZE', '200')),
+            screen_fn=self._screen,
+            lease_fn=self._renew_lease
+        )
+
+    def add_queue_listener(self, listener: Callable[[datetime], None]) -> None:
+        """Register a callback invoked with the earliest due time of newly queued emails."""
+        self._queue_listeners.append(listener)
+
+    def notify_queued(self, scheduled_time: datetime) -> None:
+        """Tell listeners, such as the queue processor, that emails were queued."""
+        for listener in self._queue_listeners:
+            try:
+                listener(scheduled_time)
+            except Exception as e:
+                print(f"Error notifying queue listener: {str(e)}")
+
+    def add_sent_listener(self, listener: Callable[[List[Tuple[Dict[str, Any], datetime]]], None]) -> None:
+        """Register a callback invoked with ``(email, sent_at)`` pairs for rows flagged ``schedule_next``."""
+        self._sent_listeners.append(listener)
+
+    def _flush_sent(self) -> None:
+        """Hand the rows sent since the last flush to the sent listeners."""
+        with self._sent_lock:
+            sent, self._sent = self._sent, []
+        if not sent:
+            return
+        for listener in self._sent_listeners:
+            try:
+                listener(sent)
+            except Exception as e:
+                print(f"Error notifying sent listener: {str(e)}")
 
     def test_connection(self) -> bool:
         """Test the SMTP connection."""
@@ -25,11 +89,7 @@ class EmailService:
                 print("SMTP settings not configured in environment variables, TestConnection")
                 return False
             
-            server = smtplib.SMTP(self._settings['smtp_host'], self._settings['smtp_port'])
-            server.starttls()
-            server.login(self._settings['smtp_username'], self._settings['smtp_password'])
-            server.quit()
-            return True
+            return self._pool.ping()
         except Exception as e:
             print(f"Error testing SMTP connection: {str(e)}")
             return False
@@ -44,8 +104,7 @@ class EmailService:
 
             # Replace template variables if provided
             if template_vars:
-                for key, value in template_vars.items():
-                    content = content.replace(f"{{{key}}}", value)
+                content = render(content, template_vars)
 
             msg = MIMEMultipart()
             msg['From'] = f"{self._settings['from_name']} <{self._settings['smtp_username']}>"
@@ -54,72 +113,177 @@ class EmailService:
 
             msg.attach(MIMEText(content, 'html'))
 
-            server = smtplib.SMTP(self._settings['smtp_host'], self._settings['smtp_port'])
-            server.starttls()
-            server.login(self._settings['smtp_username'], self._settings['smtp_password'])
-            server.send_message(msg)
-            server.quit()
+            self._pool.send_message(msg)
             return True
+        except smtplib.SMTPRecipientsRefused as e:
+            # Hard bounce: never mail this address again
+            print(f"Recipient refused, suppressing {to_email}: {str(e)}")
+            suppression_index.suppress(to_email, reason='bounced')
+            return False
         except Exception as e:
             print(f"Error sending email: {str(e)}")
             return False
 
-    def queue_email(self, sequence_id: str, step_number: int, to_email: str, subject: str, content: str, delay_days: int, user_first_name: str, user_last_name: str, user_title: str, user_location: str) -> bool:
-        """Queue an email to be sent after a delay."""
-        try:
-            if not self.test_connection():
-                print("SMTP connection failed")
-                return False
-                
-            scheduled_time = datetime.utcnow() + timedelta(days=delay_days)
-            
-            email_data = {
-                'sequence_id': sequence_id,
-                'step_number': step_number,
-                'to_email': to_email,
-                'subject': subject,
-                'content': content,
-                'scheduled_time': scheduled_time.isoformat(),
-                'status': 'PENDING',
-                'created_at': datetime.utcnow().isoformat(),
-                'template_vars': {'first_name': user_first_name, 'last_name': user_last_name, 'title': user_title, 'location': user_location}
-            }
-            
-            result = supabase.table('email_queue').insert(email_data).execute()
-            return bool(result.data)
-        except Exception as e:
-            print(f"Error queueing email: {str(e)}")
+    def _send_queued_email(self, email: Dict[str, Any]) -> bool:
+        """Send a single row from the email queue."""
+        if email.get('template_version'):
+            # Deferred row: render the shared step template for this recipient
+            subject, content = step_template_service.render(email)
+            sent = self.send_email(email['to_email'], subject, content)
+        else:
+            sent = self.send_email(
+                email['to_email'],
+                email['subject'],
+                email['content'],
+                email.get('template_vars') or {}
+            )
+        if sent and email.get('schedule_next'):
+            # Lazily scheduled row: the next step is timed from the real send
+            with self._sent_lock:
+                self._sent.append((email, datetime.utcnow()))
+        return sent
+
+    def _renew_lease(self, email: Dict[str, Any]) -> bool:
+        """Extend this worker's lease on a row right before sending it.
+
+        A page can take longer than the lease to drain. By then another
+        worker may have reclaimed the row, so the send only goes ahead if
+        the row is still locked by this worker under an unexpired lease.
+        """
+        now = datetime.utcnow()
+        result = supabase.table('email_queue')\
+            .update({'lease_expires_at': (now + timedelta(seconds=self.lease_seconds)).isoformat()})\
+            .eq('id', email['id'])\
+            .eq('locked_by', self.worker_id)\
+            .gt('lease_expires_at', now.isoformat())\
+            .execute()
+        if not result.data:
+            print(f"Lease on email {email['id']} was lost, skipping send")
             return False
+        return True
 
-    def process_email_queue(self) -> None:
-        """Process pending emails in the queue."""
-        try:
-            current_time = datetime.utcnow()
-            
-            # Get pending emails that are due
-            result = supabase.table('email_queue')\
-                .select('*')\
+    def _screen(self, email: Dict[str, Any]) -> Optional[str]:
+        """Skip suppressed recipients and release rows of paused sequences."""
+        status = suppression_index.screen(email)
+        # A paused row goes back to the pending pool untouched, to be sent on resume
+        return 'PENDING' if status == PAUSED else status
+
+    def _write_statuses(self, status: str, email_ids: List[str]) -> None:
+        """Acknowledge claimed rows with their final status in one request."""
+        supabase.table('email_queue')\
+            .update({'status': status, 'locked_by': None, 'lease_expires_at': None})\
+            .in_('id', email_ids)\
+            .eq('locked_by', self.worker_id)\
+            .execute()
+
+    def reclaim_expired_leases(self) -> int:
+        """Return in-flight rows whose lease has expired to the pending pool."""
+        result = supabase.table('email_queue')\
+            .update({'status': 'PENDING', 'locked_by': None, 'lease_expires_at': None})\
+            .eq('status', 'IN_FLIGHT')\
+            .lt('lease_expires_at', datetime.utcnow().isoformat())\
+            .execute()
+        return len(result.data or [])
+
+    def claim_emails(
+        self,
+        limit: int,
+        due_before: Optional[datetime] = None,
+        after: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """Atomically lease one page of due emails to this worker.
+
+        Candidates are read in ``(scheduled_time, id)`` order starting after
+        the ``after`` cursor. The update only matches rows that are still
+        ``PENDING``, so when several workers race for the same candidates
+        each row is won by exactly one of them. Candidates are screened
+        against the suppression index first: suppressed rows are marked in
+        bulk and rows of paused sequences are left unclaimed. Returns the
+        claimed rows, projected to ``SEND_COLUMNS``, and the cursor for the
+        next page.
+        """
+        due_before = due_before or datetime.utcnow()
+        query = supabase.table('email_queue')\
+            .select('id, scheduled_time, sequence_id, to_email')\
+            .eq('status', 'PENDING')\
+            .lte('scheduled_time', due_before.isoformat())
+        if after:
+            scheduled_time, email_id = after
+            query = query.or_(
+                f'scheduled_time.gt."{scheduled_time}",'
+                f'and(scheduled_time.eq."{scheduled_time}",id.gt.{email_id})'
+            )
+        candidates = query\
+            .order('scheduled_time')\
+            .order('id')\
+            .limit(limit)\
+            .execute()
+        if not candidates.data:
+            return [], None
+
+        last = candidates.data[-1]
+        cursor = (last['scheduled_time'], last['id'])
+
+        sendable, suppressed = [], []
+        for row in candidates.data:
+            status = suppression_index.screen(row)
+            if status is None:
+                sendable.append(row['id'])
+            elif status == SUPPRESSED:
+                suppressed.append(row['id'])
+        if suppressed:
+            supabase.table('email_queue')\
+                .update({'status': SUPPRESSED})\
+                .in_('id', suppressed)\
                 .eq('status', 'PENDING')\
-                .lte('scheduled_time', current_time.isoformat())\
                 .execute()
-            
-            for email in result.data:
-                success = self.send_email(
-                    email['to_email'],
-                    email['subject'],
-                    email['content'],
-                    email.get('template_vars', {})
-                )
-                
-                # Update email status
-                status = 'SENT' if success else 'FAILED'
-                supabase.table('email_queue')\
-                    .update({'status': status})\
-                    .eq('id', email['id'])\
-                    .execute()
+        if not sendable:
+            return [], cursor
+
+        lease_expires_at = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        result = supabase.table('email_queue')\
+            .update({
+                'status': 'IN_FLIGHT',
+                'locked_by': self.worker_id,
+                'lease_expires_at': lease_expires_at.isoformat()
+            })\
+            .in_('id', sendable)\
+            .eq('status', 'PENDING')\
+            .execute()
+        claimed = [{column: row.get(column) for column in SEND_COLUMNS} for row in result.data or []]
+        return claimed, cursor
+
+    def iter_due_emails(self, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield due emails one claimed page at a time.
+
+        Only a single page is held in memory, however large the backlog.
+        """
+        page_size = page_size or self.claim_batch_size
+        due_before = datetime.utcnow()
+        cursor = None
+        while True:
+            claimed, cursor = self.claim_emails(page_size, due_before=due_before, after=cursor)
+            if cursor is None:
+                return
+            step_template_service.prefetch(claimed)
+            yield from claimed
+
+    def process_email_queue(self) -> None:
+        """Stream due emails through the dispatcher until none are left."""
+        try:
+            suppression_index.refresh()
+            reclaimed = self.reclaim_expired_leases()
+            if reclaimed:
+                print(f"Reclaimed {reclaimed} emails with expired leases")
+
+            counts = self._dispatcher.dispatch(self.iter_due_emails())
+            if counts:
+                print(f"Processed email queue: {counts}")
                 
         except Exception as e:
             print(f"Error processing email queue: {str(e)}")
+        finally:
+            self._flush_sent()
 
 # Create a singleton instance
-email_service = EmailService() 
\ No newline at end of file
+email_service = EmailService()
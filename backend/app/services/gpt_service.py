@@ -1,17 +1,40 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Iterator
 from dotenv import load_dotenv
 from app.services.message_service import message_service
-from app.services.sequence_service import sequence_service
+from app.services.sequence_service import sequence_service, SEQUENCE_OPERATIONS
+from app.services.context_builder import context_builder, count_tokens, truncate_tokens
+from app.services.document_index import document_index
+from app.services.response_cache import response_cache
+from app.services.llm_client import llm_client
+from app.utils.rate_limiter import RateLimiter
 
 load_dotenv()
 
+# Rough completion size of a generated sequence, used for token rate limiting
+SEQUENCE_OUTPUT_TOKEN_ESTIMATE = 1500
+
+# Retrieved document chunks added to a chat turn when a folder is selected
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '4'))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '800'))
+
+def describe_sequence(sequence: Dict[str, Any]) -> str:
+    """Render a sequence compactly so the model can target individual steps."""
+    lines = [f"Current sequence: {sequence.get('title', '')}", f"Description: {sequence.get('description', '')}"]
+    for step in sequence.get('steps') or []:
+        lines.append(
+            f"Step {step.get('step_number')} ({step.get('type', 'email')}, delay {step.get('delay_days')} days) "
+            f"- {step.get('step_title', '')}:\n{step.get('content', '')}"
+        )
+    return "\n".join(lines)
+
 class GPTService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-4o-mini"
+        self.llm = llm_client
+        self.model = llm_client.model
         self.default_system_prompt = self.default_system_prompt = """
         You are a helpful assistant who helps create and edit email sequences for recruitment outreach for a technical/non-technical recruiter.
         The company is a startup called "SellScale" and the product is a platform that helps companies with their sales and outreach. 
@@ -44,7 +67,10 @@ class GPTService:
             Only edit the sequence if the users asks you to and if you have the sequence_id. But never ask the user for the sequence_id.
             Don't ask the user if they want to edit the sequence. If they want to edit the sequence, you will automatically edit it.
            - If the user requests an edit, interpret their instructions as modifications to the user story or step structure.
-           - Call `edit_sequence` with:
+           - For targeted changes (rewording a step, changing a delay, adding or removing a step, renaming), call `patch_sequence` with:
+             • The existing `sequence_id` (never ask the user for it)
+             • An `operations` list containing only the changes, never the unchanged steps.
+           - Only when the whole sequence must be rewritten, call `edit_sequence` with:
              • The existing `sequence_id` (never ask the user for it)
              • An `updates` object describing what to change (e.g., number of steps, delays, content tweaks).
            - Do not request content, titles, or sequence_id from the user during edits.
@@ -147,6 +173,45 @@ class GPTService:
             }
         }
 
+        self._rate_limiter = RateLimiter(
+            requests_per_minute=int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '0')),
+            tokens_per_minute=int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '0'))
+        )
+
+        self.available_functions["patch_sequence"] = {
+            "name": "patch_sequence",
+            "description": "Apply small, targeted changes to an existing sequence without resending unchanged steps",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sequence_id": {"type": "string", "description": "The ID of the sequence to edit"},
+                    "operations": {
+                        "type": "array",
+                        "description": "The changes to apply, in order",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "op": {
+                                    "type": "string",
+                                    "enum": list(SEQUENCE_OPERATIONS),
+                                    "description": "The kind of change"
+                                },
+                                "step_number": {"type": "integer", "description": "The step to change, or the position for insert_step"},
+                                "content": {"type": "string", "description": "New step content for replace_content or insert_step"},
+                                "step_title": {"type": "string", "description": "New step title for set_step_title or insert_step"},
+                                "delay_days": {"type": "integer", "description": "New delay for set_delay or insert_step"},
+                                "type": {"type": "string", "description": "The type of message for insert_step"},
+                                "value": {"type": "string", "description": "New value for set_title or set_description"}
+                            },
+                            "required": ["op"]
+                        }
+                    }
+                },
+                "required": ["sequence_id", "operations"]
+            }
+        }
+        self._functions_key = response_cache.functions_key(list(self.available_functions.values()))
+
         # Define response type
         self.Response = {
             "type": str,
@@ -155,97 +220,364 @@ class GPTService:
             "sequence": object
         }
 
-    def chat_completion(self, session_id: str, message: str, sequence_id: str = None) -> dict:
+    def _retrieve_documents(self, folder_id: str, message: str) -> Optional[str]:
+        """Return the folder's document chunks most relevant to the message, within the token budget."""
+        try:
+            chunks = document_index.search(folder_id, message, k=RETRIEVAL_TOP_K)
+        except Exception as e:
+            print(f"Error retrieving documents for folder {folder_id}: {str(e)}")
+            return None
+        per_chunk = RETRIEVAL_TOKEN_BUDGET // max(1, len(chunks))
+        excerpts = [truncate_tokens(chunk['text'], per_chunk) for chunk in chunks]
+        if not excerpts:
+            return None
+        return "Relevant excerpts from the user's documents:\n" + "\n---\n".join(excerpts)
+
+    def _build_messages(self, session_id: str, message: str, sequence_id: str = None, folder_id: str = None) -> List[Dict[str, Any]]:
+        """Build the prompt: system prompt, sequence and document context, packed history and the new message."""
+        # Start with system prompt
+        system_messages = [
+            {"role": "system", "content": self.default_system_prompt}
+        ]
+
+        # If updating an existing sequence, let the model know the ID
+        if sequence_id:
+            system_messages.append({
+                "role": "system",
+                "content": (
+                    f"Current sequence_id: {sequence_id}. "
+                    "When updating, you must call patch_sequence or edit_sequence with that ID; "
+                    "do not ask the user for it."
+                )
+            })
+            sequence = self.sequence_service.get_sequence(sequence_id)
+            if sequence:
+                system_messages.append({"role": "system", "content": describe_sequence(sequence)})
+
+        # Ground the reply in the selected folder's documents
+        if folder_id:
+            documents = self._retrieve_documents(folder_id, message)
+            if documents:
+                system_messages.append({"role": "system", "content": documents})
+
+        # Add the new user message
+        user_message = {"role": "user", "content": message}
+        if sequence_id:
+            user_message["sequence_id"] = sequence_id
+
+        # Recent history packed to the token budget, older turns summarized
+        return context_builder.build(session_id, system_messages, user_message)
+
+    def _store_turn(self, session_id: str, message: str, content: str, sequence_id: str = None) -> None:
+        """Persist the assistant reply and the user message of a chat turn."""
+        metadata = {"sequence_id": sequence_id} if sequence_id else None
+
+        # Store the assistant's message
+        self.message_service.create_message(
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            metadata=metadata
+        )
+
+        self.message_service.create_message(
+            session_id=session_id,
+            role="user",
+            content=message,
+            metadata=metadata
+        )
+
+    def _handle_function_call(self, fn_name: str, fn_args: Dict[str, Any], sequence_id: str = None) -> dict:
+        """Run a function requested by the model and build the response payload."""
+        if fn_name == "create_sequence":
+            seq = self.sequence_service.create_sequence(
+                title=fn_args["title"],
+                description=fn_args["description"],
+                steps=fn_args["steps"],
+                metadata=fn_args.get("metadata", {}),
+            )
+            return {"type": "sequence_created", "message": f"Created '{seq['title']}' with {len(seq['steps'])} steps.", "sequence": seq, "role": "assistant"}
+
+        if fn_name == "edit_sequence":
+            es_id = fn_args.get("sequence_id") or sequence_id
+            if not es_id:
+                raise ValueError("Sequence ID is required for editing")
+            seq = self.sequence_service.update_sequence(sequence_id=es_id, updates=fn_args["updates"])
+            return {"type": "sequence_updated", "message": f"Updated '{seq['title']}' with {len(seq['steps'])} steps.", "sequence": seq, "role": "assistant"}
+
+        if fn_name == "patch_sequence":
+            ps_id = fn_args.get("sequence_id") or sequence_id
+            if not ps_id:
+                raise ValueError("Sequence ID is required for editing")
+            seq = self.sequence_service.patch_sequence(ps_id, fn_args["operations"])
+            return {"type": "sequence_updated", "message": f"Updated '{seq['title']}' with {len(seq['steps'])} steps.", "sequence": seq, "role": "assistant"}
+
+        raise ValueError(f"Unknown function: {fn_name}")
+
+    @staticmethod
+    def _to_result(response) -> Dict[str, Any]:
+        """Reduce an OpenAI response to the cacheable content and function call."""
+        response_message = response.choices[0].message
+        function_call = None
+        if response_message.function_call:
+            function_call = {
+                "name": response_message.function_call.name,
+                "arguments": response_message.function_call.arguments
+            }
+        return {"content": response_message.content, "function_call": function_call}
+
+    def _create_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        function_call: Any = "auto"
+    ) -> Dict[str, Any]:
+        """Call the model, serving repeated requests from the response cache."""
+        functions_key = self._functions_key if function_call == "auto" else f"{self._functions_key}:{function_call['name']}"
+        cached = response_cache.get(messages, self.model, temperature, functions_key)
+        if cached is not None:
+            return cached
+
+        # Call the OpenAI API with function definitions
+        response = self.llm.create(
+            messages=messages,
+            temperature=temperature,
+            functions=list(self.available_functions.values()),
+            function_call=function_call,
+        )
+        result = self._to_result(response)
+        response_cache.set(messages, self.model, temperature, functions_key, result)
+        return result
+
+    async def _create_completion_async(self, messages: List[Dict[str, Any]], temperature: float = 0.1) -> Dict[str, Any]:
+        """Async counterpart of ``_create_completion``."""
+        cached = response_cache.get(messages, self.model, temperature, self._functions_key)
+        if cached is not None:
+            return cached
+
+        response = await self.llm.acreate(
+            messages=messages,
+            temperature=temperature,
+            functions=list(self.available_functions.values()),
+            function_call="auto",
+        )
+        result = self._to_result(response)
+        response_cache.set(messages, self.model, temperature, self._functions_key, result)
+        return result
+
+    def _generate_sequence_args(self, prompt: str) -> Dict[str, Any]:
+        """Have the model draft a sequence for a user story without persisting it."""
+        messages = [
+            {"role": "system", "content": self.default_system_prompt},
+            {
+                "role": "system",
+                "content": "The full user story is below. Create the sequence now with create_sequence; do not ask questions."
+            },
+            {"role": "user", "content": prompt}
+        ]
+        result = self._create_completion(messages, function_call={"name": "create_sequence"})
+        if not result["function_call"]:
+            raise ValueError("Model did not return a sequence")
+        return json.loads(result["function_call"]["arguments"])
+
+    def edit_sequence(self, sequence_id: str, prompt: str) -> dict:
+        """Apply a natural-language edit to a sequence as a patch."""
+        sequence = self.sequence_service.get_sequence(sequence_id)
+        if not sequence:
+            raise ValueError("Sequence not found")
+        messages = [
+            {"role": "system", "content": self.default_system_prompt},
+            {"role": "system", "content": f"Current sequence_id: {sequence_id}.\n{describe_sequence(sequence)}"},
+            {"role": "user", "content": prompt}
+        ]
+        result = self._create_completion(messages, function_call={"name": "patch_sequence"})
+        if not result["function_call"]:
+            raise ValueError("Model did not return any changes")
+        fn_args = json.loads(result["function_call"]["arguments"])
+        return self._handle_function_call("patch_sequence", fn_args, sequence_id)
+
+    def generate_sequence(self, prompt: str) -> dict:
+        """Generate and save a sequence from a single user story."""
+        fn_args = self._generate_sequence_args(prompt)
+        return self.sequence_service.create_sequence(
+            title=fn_args["title"],
+            description=fn_args["description"],
+            steps=fn_args["steps"],
+            metadata=fn_args.get("metadata", {}),
+        )
+
+    def generate_sequences(self, prompts: List[str], max_concurrency: int = None, persist_batch_size: int = None) -> Iterator[dict]:
+        """Generate sequences for many user stories concurrently.
+
+        Generations run on a bounded thread pool behind the per-minute
+        request/token limiter. Drafts are saved as soon as they finish: the
+        ones that finish together go to ``SequenceService.create_sequences``
+        as one bulk insert of at most ``persist_batch_size`` rows. One event
+        is yielded per prompt as soon as its result is saved or its
+        generation fails.
+        """
+        concurrency_limit = int(os.getenv('SEQUENCE_BATCH_CONCURRENCY', '4'))
+        max_concurrency = max(1, min(int(max_concurrency or concurrency_limit), concurrency_limit))
+        persist_batch_size = persist_batch_size or int(os.getenv('SEQUENCE_BATCH_PERSIST_SIZE', '10'))
+        prompt_tokens = count_tokens(self.default_system_prompt) + SEQUENCE_OUTPUT_TOKEN_ESTIMATE
+
+        def generate(prompt: str) -> Dict[str, Any]:
+            self._rate_limiter.acquire(prompt_tokens + count_tokens(prompt))
+            return self._generate_sequence_args(prompt)
+
+        def persist(drafts):
+            try:
+                saved = self.sequence_service.create_sequences([draft for _, draft in drafts])
+            except Exception as e:
+                print(f"Error saving generated sequences: {str(e)}")
+                return [{"index": index, "status": "error", "error": str(e)} for index, _ in drafts]
+            return [{"index": index, "status": "created", "sequence": seq} for (index, _), seq in zip(drafts, saved)]
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {executor.submit(generate, prompt): index for index, prompt in enumerate(prompts)}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drafts = []
+                for future in sorted(done, key=futures.get):
+                    index = futures[future]
+                    try:
+                        drafts.append((index, future.result()))
+                    except Exception as e:
+                        print(f"Error generating sequence {index}: {str(e)}")
+                        yield {"index": index, "status": "error", "error": str(e)}
+                for start in range(0, len(drafts), persist_batch_size):
+                    yield from persist(drafts[start:start + persist_batch_size])
+
+    def chat_completion(self, session_id: str, message: str, sequence_id: str = None, folder_id: str = None) -> dict:
         """Process a chat message and return a response.
         This can either ask questions or generate/edit sequences based on the conversation.
         """
         try:
-            # Get recent messages for context
-            recent_messages = self.message_service.get_messages(session_id, limit=10)
-            # Start with system prompt
-            messages = [
-                {"role": "system", "content": self.default_system_prompt}
+            messages = self._build_messages(session_id, message, sequence_id, folder_id)
+
+            result = self._create_completion(messages)
+            content = result["content"] or "No response content available"
+
+            self._store_turn(session_id, message, content, sequence_id)
+
+            # Handle function calls
+            if result["function_call"]:
+                fn_name = result["function_call"]["name"]
+                fn_args = json.loads(result["function_call"]["arguments"])
+                response_data = self._handle_function_call(fn_name, fn_args, sequence_id)
+            else:
+                response_data = {"type": "chat", "message": content, "sequence": None, "role": "assistant"}
+
+            return response_data
+        except Exception as e:
+            print(f"Error in chat completion: {str(e)}")
+            raise
+
+    async def chat_completion_async(self, session_id: str, message: str, sequence_id: str = None, folder_id: str = None) -> dict:
+        """Async variant of ``chat_completion``.
+
+        The model call is awaited on the async LLM client. Supabase calls run in
+        worker threads so the event loop is never blocked, and the message
+        inserts and any sequence write run concurrently.
+        """
+        try:
+            messages = await asyncio.to_thread(self._build_messages, session_id, message, sequence_id, folder_id)
+
+            result = await self._create_completion_async(messages)
+            content = result["content"] or "No response content available"
+            metadata = {"sequence_id": sequence_id} if sequence_id else None
+
+            writes = [
+                asyncio.to_thread(
+                    self.message_service.create_message,
+                    session_id=session_id, role="assistant", content=content, metadata=metadata
+                ),
+                asyncio.to_thread(
+                    self.message_service.create_message,
+                    session_id=session_id, role="user", content=message, metadata=metadata
+                ),
             ]
 
-            # If updating an existing sequence, let the model know the ID
-            if sequence_id:
-                messages.append({
-                    "role": "system",
-                    "content": (
-                        f"Current sequence_id: {sequence_id}. "
-                        "When updating, you must call edit_sequence with that ID; "
-                        "do not ask the user for it."
-                    )
-                })
-
-            # Append recent conversation history
-            for msg in recent_messages:
-                messages.append({
-                    "role": msg.get("role", "user"),
-                    "content": msg.get("content", ""),
-                })
-
-            # Add the new user message
-            user_message = {"role": "user", "content": message}
-            if sequence_id:
-                user_message["sequence_id"] = sequence_id
-            messages.append(user_message)
-
-            print(messages)
-            # Call the OpenAI API with function definitions
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            # Handle function calls
+            if result["function_call"]:
+                fn_args = json.loads(result["function_call"]["arguments"])
+                writes.append(asyncio.to_thread(
+                    self._handle_function_call, result["function_call"]["name"], fn_args, sequence_id
+                ))
+                results = await asyncio.gather(*writes)
+                return results[-1]
+
+            await asyncio.gather(*writes)
+            return {"type": "chat", "message": content, "sequence": None, "role": "assistant"}
+        except Exception as e:
+            print(f"Error in async chat completion: {str(e)}")
+            raise
+
+    def chat_completion_stream(self, session_id: str, message: str, sequence_id: str = None, folder_id: str = None) -> Iterator[dict]:
+        """Process a chat message, yielding events as model tokens arrive.
+
+        Yields ``{"type": "token", "content": ...}`` for each content delta,
+        ``{"type": "function_call", "name": ...}`` once the model starts a
+        function call, and finally the same payload ``chat_completion``
+        returns (``chat``, ``sequence_created`` or ``sequence_updated``).
+        """
+        try:
+            messages = self._build_messages(session_id, message, sequence_id, folder_id)
+
+            cached = response_cache.get(messages, self.model, 0.1, self._functions_key)
+            if cached is not None:
+                content = cached["content"] or "No response content available"
+                if cached["content"]:
+                    yield {"type": "token", "content": cached["content"]}
+                self._store_turn(session_id, message, content, sequence_id)
+                if cached["function_call"]:
+                    fn_args = json.loads(cached["function_call"]["arguments"])
+                    yield self._handle_function_call(cached["function_call"]["name"], fn_args, sequence_id)
+                else:
+                    yield {"type": "chat", "message": content, "sequence": None, "role": "assistant"}
+                return
+
+            stream = self.llm.create(
                 messages=messages,
                 temperature=0.1,
                 functions=list(self.available_functions.values()),
                 function_call="auto",
+                stream=True,
             )
 
-            response_message = response.choices[0].message
-            content = response_message.content or "No response content available"
+            content_parts = []
+            fn_name = None
+            fn_arg_parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield {"type": "token", "content": delta.content}
+                if delta.function_call:
+                    if delta.function_call.name:
+                        fn_name = delta.function_call.name
+                        yield {"type": "function_call", "name": fn_name}
+                    if delta.function_call.arguments:
+                        fn_arg_parts.append(delta.function_call.arguments)
 
-            # Store the assistant's message
-            self.message_service.create_message(
-                session_id=session_id,
-                role="assistant",
-                content=content,
-                metadata={"sequence_id": sequence_id} if sequence_id else None
-            )
+            response_cache.set(messages, self.model, 0.1, self._functions_key, {
+                "content": "".join(content_parts) or None,
+                "function_call": {"name": fn_name, "arguments": "".join(fn_arg_parts)} if fn_name else None
+            })
+            content = "".join(content_parts) or "No response content available"
+            self._store_turn(session_id, message, content, sequence_id)
 
-            self.message_service.create_message(
-                session_id=session_id,
-                role="user",
-                content=message,
-                metadata={"sequence_id": sequence_id} if sequence_id else None
-            )
-
-            # Handle function calls
-            if hasattr(response_message, 'function_call') and response_message.function_call:
-                fn_name = response_message.function_call.name
-                fn_args = json.loads(response_message.function_call.arguments)
-
-                if fn_name == "create_sequence":
-                    seq = self.sequence_service.create_sequence(
-                        title=fn_args["title"],
-                        description=fn_args["description"],
-                        steps=fn_args["steps"],
-                        metadata=fn_args.get("metadata", {}),
-                    )
-                    response_data = {"type": "sequence_created", "message": f"Created '{seq['title']}' with {len(seq['steps'])} steps.", "sequence": seq, "role": "assistant"}
-
-                elif fn_name == "edit_sequence":
-                    es_id = fn_args.get("sequence_id") or sequence_id
-                    if not es_id:
-                        raise ValueError("Sequence ID is required for editing")
-                    seq = self.sequence_service.update_sequence(sequence_id=es_id, updates=fn_args["updates"])
-                    response_data = {"type": "sequence_updated", "message": f"Updated '{seq['title']}' with {len(seq['steps'])} steps.", "sequence": seq, "role": "assistant"}
+            if fn_name:
+                fn_args = json.loads("".join(fn_arg_parts))
+                yield self._handle_function_call(fn_name, fn_args, sequence_id)
             else:
-                response_data = {"type": "chat", "message": content, "sequence": None, "role": "assistant"}
-
-            return response_data
+                yield {"type": "chat", "message": content, "sequence": None, "role": "assistant"}
         except Exception as e:
-            print(f"Error in chat completion: {str(e)}")
-            raise
+            print(f"Error in streaming chat completion: {str(e)}")
+            yield {"type": "error", "message": str(e), "role": "assistant"}
 
 # instantiate service
 gpt_service = GPTService()
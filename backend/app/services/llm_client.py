@@ -0,0 +1,204 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Any
+import openai
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an OpenAI error is worth retrying: 429, 5xx, timeouts and dropped connections."""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class LLMClient:
+    """Chat completion client with deadlines, retries, model tiers and hedging.
+
+    Each request tries the model tiers in order, starting with the fast model.
+    Within a tier, retryable errors are retried with jittered exponential
+    backoff; once a tier is exhausted the request escalates to the next
+    one. Everything must finish within ``deadline`` seconds. With hedging
+    enabled, a duplicate request is sent when the first has not answered
+    by the observed p95 latency, and the first response wins.
+    ``base_url`` lets the client point at any OpenAI-compatible server,
+    including a local fake for tests. Each async call opens its own
+    ``AsyncOpenAI`` and closes it on return: its pooled connections are
+    bound to the loop that opened them, and Flask runs each async view in a
+    new loop, so there is nothing to reuse across requests.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        models: Optional[List[str]] = None,
+        timeout: float = 60.0,
+        deadline: float = 120.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_min_delay: float = 2.0,
+        hedge_workers: int = 8
+    ):
+        self.models = models or ["gpt-4o-mini"]
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        # Retries are handled here, so the SDK's own retry loop is disabled
+        self.api_key = api_key
+        self.base_url = base_url
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self._latencies = deque(maxlen=200)
+        self._latency_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers) if hedge else None
+
+    @property
+    def model(self) -> str:
+        """The fast, first-tier model."""
+        return self.models[0]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._latency_lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """Return the p95 of recent latencies, never below ``hedge_min_delay``."""
+        with self._latency_lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 20:
+            return max(self.hedge_min_delay, self.timeout / 2)
+        return max(self.hedge_min_delay, latencies[int(len(latencies) * 0.95) - 1])
+
+    def _call(self, model: str, timeout: float, **kwargs) -> Any:
+        started = time.monotonic()
+        response = self.client.chat.completions.create(model=model, timeout=timeout, **kwargs)
+        if not kwargs.get('stream'):
+            self._record_latency(time.monotonic() - started)
+        return response
+
+    def _hedged_call(self, model: str, timeout: float, **kwargs) -> Any:
+        primary = self._executor.submit(self._call, model, timeout, **kwargs)
+        done, _ = wait([primary], timeout=min(self.hedge_delay(), timeout))
+        if done:
+            return primary.result()
+
+        backup = self._executor.submit(self._call, model, timeout, **kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def create(self, **kwargs) -> Any:
+        """Create a chat completion; accepts the same arguments as the SDK minus ``model``."""
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        for model in self.models:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise last_error or TimeoutError("LLM request deadline exceeded")
+                timeout = min(self.timeout, remaining)
+                try:
+                    if self.hedge and not kwargs.get('stream'):
+                        return self._hedged_call(model, timeout, **kwargs)
+                    return self._call(model, timeout, **kwargs)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last_error = e
+                    print(f"LLM call to {model} failed ({str(e)}), attempt {attempt + 1}")
+                    if attempt < self.max_retries:
+                        time.sleep(min(self._backoff(attempt), max(0.0, deadline - time.monotonic())))
+            print(f"Escalating from {model} after {self.max_retries + 1} attempts")
+        raise last_error
+
+    async def acreate(self, **kwargs) -> Any:
+        """Async counterpart of ``create``; hedges with a second task instead of a thread.
+
+        Retries, escalations and hedges of the call share one client, which
+        is closed before returning.
+        """
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) as client:
+            for model in self.models:
+                for attempt in range(self.max_retries + 1):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise last_error or TimeoutError("LLM request deadline exceeded")
+                    timeout = min(self.timeout, remaining)
+                    try:
+                        return await self._acall(client, model, timeout, **kwargs)
+                    except Exception as e:
+                        if not is_retryable(e):
+                            raise
+                        last_error = e
+                        print(f"LLM call to {model} failed ({str(e)}), attempt {attempt + 1}")
+                        if attempt < self.max_retries:
+                            await asyncio.sleep(min(self._backoff(attempt), max(0.0, deadline - time.monotonic())))
+                print(f"Escalating from {model} after {self.max_retries + 1} attempts")
+        raise last_error
+
+    async def _acall(self, client: AsyncOpenAI, model: str, timeout: float, **kwargs) -> Any:
+        async def call():
+            started = time.monotonic()
+            response = await client.chat.completions.create(model=model, timeout=timeout, **kwargs)
+            self._record_latency(time.monotonic() - started)
+            return response
+
+        if not self.hedge:
+            return await call()
+
+        primary = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({primary}, timeout=min(self.hedge_delay(), timeout))
+        if done:
+            return primary.result()
+
+        pending = {primary, asyncio.ensure_future(call())}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    # Let the loser finish cancelling before the client is closed
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    return task.result()
+                error = task.exception()
+        raise error
+
+# Create a singleton instance
+llm_client = LLMClient(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    models=[model.strip() for model in os.getenv("OPENAI_MODEL_TIERS", "gpt-4o-mini,gpt-4o").split(",") if model.strip()],
+    timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")),
+    deadline=float(os.getenv("OPENAI_DEADLINE_SECONDS", "120")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    hedge=os.getenv("OPENAI_HEDGE_REQUESTS", "false").lower() == "true"
+)
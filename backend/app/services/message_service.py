@@ -2,6 +2,7 @@ from datetime import datetime
 import uuid
 from typing import List, Dict, Any, Optional
 from app.config.supabase import supabase, MESSAGES_TABLE, SESSIONS_TABLE
+from app.services.conversation_cache import conversation_cache
 
 class MessageService:
     @staticmethod
@@ -38,6 +39,7 @@ class MessageService:
         }
         
         result = supabase.table(MESSAGES_TABLE).insert(message).execute()
+        conversation_cache.append(session_id, result.data[0])
         return result.data[0]
 
     @staticmethod
@@ -46,16 +48,71 @@ class MessageService:
         limit: int = 10,
         offset: int = 0
     ) -> List[Dict[str, Any]]:
-        """Get messages for a session."""
+        """Get messages for a session, newest first, served from the conversation cache."""
+        return conversation_cache.get_messages(
+            session_id,
+            limit,
+            offset,
+            loader=lambda count: MessageService._load_messages(session_id, count)
+        )
+
+    @staticmethod
+    def _load_messages(session_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Fetch the newest messages for a session from the database."""
         result = supabase.table(MESSAGES_TABLE)\
             .select('*')\
             .eq('session_id', session_id)\
             .order('created_at', desc=True)\
             .limit(limit)\
-            .offset(offset)\
             .execute()
             
         return result.data
 
+    @staticmethod
+    def get_messages_before(
+        session_id: str,
+        before: str,
+        after: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Fetch the newest ``limit`` messages created before ``before`` and after ``after``, oldest first."""
+        query = supabase.table(MESSAGES_TABLE)\
+            .select('*')\
+            .eq('session_id', session_id)\
+            .lt('created_at', before)
+        if after:
+            query = query.gt('created_at', after)
+        result = query\
+            .order('created_at', desc=True)\
+            .limit(limit)\
+            .execute()
+        return list(reversed(result.data))
+
+    @staticmethod
+    def get_session_summary(session_id: str) -> Dict[str, Optional[str]]:
+        """Get the rolling conversation summary stored on a session."""
+        result = supabase.table(SESSIONS_TABLE)\
+            .select('summary, summary_until')\
+            .eq('id', session_id)\
+            .execute()
+        if not result.data:
+            return {'summary': None, 'summary_until': None}
+        return {
+            'summary': result.data[0].get('summary'),
+            'summary_until': result.data[0].get('summary_until')
+        }
+
+    @staticmethod
+    def update_session_summary(session_id: str, summary: str, summary_until: Optional[str]) -> None:
+        """Store the rolling conversation summary on a session."""
+        supabase.table(SESSIONS_TABLE)\
+            .update({
+                'summary': summary,
+                'summary_until': summary_until,
+                'updated_at': datetime.utcnow().isoformat()
+            })\
+            .eq('id', session_id)\
+            .execute()
+
 # Create a singleton instance
 message_service = MessageService() 
\ No newline at end of file
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import threading
+from typing import Dict, List, Any, Iterator, Optional
+import numpy as np
+
+USERS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'users.json')
+
+# Attributes with a value -> row index lookup
+INDEXED_FIELDS = ('title', 'location')
+
+# Comparison operators allowed in segment filters
+SEGMENT_OPS = ('eq', 'neq', 'in', 'not_in', 'contains', 'startswith')
+
+
+def validate_segment(segment: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Check a segment definition and return its list of filters.
+
+    A segment is ``{"filters": [{"field": ..., "op": ..., "value": ...}]}``;
+    a recipient matches when every filter matches. An empty or missing
+    segment matches everyone.
+    """
+    if not segment:
+        return []
+    if not isinstance(segment, dict) or not isinstance(segment.get('filters', []), list):
+        raise ValueError("Segment must be an object with a 'filters' list")
+    filters = segment.get('filters', [])
+    for segment_filter in filters:
+        if not isinstance(segment_filter, dict) or not segment_filter.get('field'):
+            raise ValueError("Each segment filter needs a 'field'")
+        if segment_filter.get('op') not in SEGMENT_OPS:
+            raise ValueError(f"Segment filter op must be one of: {', '.join(SEGMENT_OPS)}")
+        if segment_filter['op'] in ('in', 'not_in') and not isinstance(segment_filter.get('value'), list):
+            raise ValueError(f"Segment filter op '{segment_filter['op']}' needs a list value")
+    return filters
+
+
+class _Snapshot:
+    """Columns of one load of the file, with the indexes built from them."""
+
+    def __init__(
+        self,
+        columns: Dict[str, List[Any]],
+        size: int,
+        by_email: Dict[str, int],
+        indexes: Dict[str, Dict[str, List[int]]]
+    ):
+        self.columns = columns
+        self.size = size
+        self.by_email = by_email
+        self.indexes = indexes
+        self.lowered: Dict[str, np.ndarray] = {}
+
+    def column_array(self, field: str) -> np.ndarray:
+        """Lower-cased string array of a column, built once per load."""
+        array = self.lowered.get(field)
+        if array is None:
+            values = self.columns.get(field) or [None] * self.size
+            array = np.array(['' if value is None else str(value).lower() for value in values], dtype=str)
+            self.lowered[field] = array
+        return array
+
+    def mask(self, segment_filter: Dict[str, Any]) -> np.ndarray:
+        field, op, value = segment_filter['field'], segment_filter['op'], segment_filter.get('value')
+        if op in ('eq', 'in') and field in self.indexes:
+            mask = np.zeros(self.size, dtype=bool)
+            for item in (value if op == 'in' else [value]):
+                mask[self.indexes[field].get(str(item).lower(), [])] = True
+            return mask
+
+        column = self.column_array(field)
+        if op in ('eq', 'neq'):
+            mask = column == str(value).lower()
+        elif op in ('in', 'not_in'):
+            mask = np.isin(column, [str(item).lower() for item in value])
+        elif op == 'contains':
+            mask = np.char.find(column, str(value).lower()) >= 0
+        else:
+            mask = np.char.startswith(column, str(value).lower())
+        return ~mask if op in ('neq', 'not_in') else mask
+
+    def row(self, row: int) -> Dict[str, Any]:
+        return {field: values[row] for field, values in self.columns.items() if values[row] is not None}
+
+    def filter_rows(self, filters: List[Dict[str, Any]]) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for segment_filter in filters:
+            mask &= self.mask(segment_filter)
+            if not mask.any():
+                break
+        return np.flatnonzero(mask)
+
+
+class RecipientStore:
+    """Columnar, indexed view of the recipients in ``users.json``.
+
+    The file is parsed once and reloaded only when its mtime changes. Rows
+    are stored column by column, with string values interned so repeated
+    titles and locations share memory. Lookups by email and by indexed
+    attributes avoid scanning every recipient. Each load is an immutable snapshot, so a segment is
+    filtered and streamed from the same version of the file.
+    """
+
+    def __init__(self, path: str = USERS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._snapshot = _Snapshot({}, 0, {}, {})
+
+    def _load(self) -> _Snapshot:
+        """Reload the file if it changed since the last load and return the current snapshot."""
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return self._snapshot
+        with self._lock:
+            if mtime == self._mtime:
+                return self._snapshot
+            with open(self.path, 'r') as f:
+                users = json.load(f)
+
+            fields = []
+            for user in users:
+                for field in user:
+                    if field not in fields:
+                        fields.append(field)
+
+            columns = {field: [] for field in fields}
+            for user in users:
+                for field in fields:
+                    value = user.get(field)
+                    columns[field].append(sys.intern(value) if isinstance(value, str) else value)
+
+            by_email = {}
+            for row, email in enumerate(columns.get('email', [])):
+                if email:
+                    by_email.setdefault(str(email).lower(), row)
+
+            indexes = {}
+            for field in INDEXED_FIELDS:
+                index: Dict[str, List[int]] = {}
+                for row, value in enumerate(columns.get(field, [])):
+                    if value is not None:
+                        index.setdefault(str(value).lower(), []).append(row)
+                indexes[field] = index
+
+            self._snapshot = _Snapshot(columns, len(users), by_email, indexes)
+            self._mtime = mtime
+            return self._snapshot
+
+    def __len__(self) -> int:
+        return self._load().size
+
+    def iter_users(self, filters: Optional[List[Dict[str, Any]]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream recipients, or only those matching the filters, without building a full list.
+
+        Fields a recipient does not have are left out, as in the file.
+        """
+        snapshot = self._load()
+        rows = snapshot.filter_rows(filters) if filters else range(snapshot.size)
+        for row in rows:
+            yield snapshot.row(int(row))
+
+    def filter_rows(self, filters: List[Dict[str, Any]]) -> np.ndarray:
+        """Evaluate segment filters column-wise and return the matching row ids."""
+        return self._load().filter_rows(filters)
+
+    def count(self, filters: List[Dict[str, Any]]) -> int:
+        """Return how many recipients match the filters."""
+        return int(len(self.filter_rows(filters))) if filters else len(self)
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Return the recipient with this email (case-insensitive), or None."""
+        snapshot = self._load()
+        row = snapshot.by_email.get(email.lower())
+        return snapshot.row(row) if row is not None else None
+
+# Create a singleton instance
+recipient_store = RecipientStore()
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+from app.utils.cache import TTLCache
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(text: Any) -> str:
+    return _WHITESPACE_RE.sub(' ', str(text or '')).strip()
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Cache of LLM responses keyed on the normalized request.
+
+    The exact tier hashes the normalized message list together with the
+    model, temperature and function schema. The optional semantic tier
+    compares the final user message against earlier requests that share
+    the rest of the prompt, using a local sentence-transformers model, and
+    reuses a response above ``semantic_threshold`` cosine similarity. Only
+    plain replies and calls to ``semantic_functions`` are reused this way:
+    two edits that differ in one number look alike but must not share a
+    function call.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 3600.0,
+        semantic: bool = False,
+        semantic_threshold: float = 0.95,
+        semantic_model: str = 'all-MiniLM-L6-v2',
+        semantic_functions: Tuple[str, ...] = ('create_sequence',)
+    ):
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.semantic_model = semantic_model
+        self.semantic_functions = semantic_functions
+        self.semantic_hits = 0
+        self._exact = TTLCache(max_size=max_size, ttl=ttl)
+        # prefix key -> list of (embedding, exact key) for the semantic tier
+        self._neighbours = TTLCache(max_size=max_size, ttl=ttl)
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+
+    @staticmethod
+    def functions_key(functions: List[Dict[str, Any]]) -> str:
+        """Hash a function schema once so callers can reuse it for every lookup."""
+        return _digest(functions)
+
+    @staticmethod
+    def _keys(messages: List[Dict[str, Any]], model: str, temperature: float, functions_key: str):
+        normalized = [{'role': m.get('role'), 'content': _normalize(m.get('content'))} for m in messages]
+        settings = {'model': model, 'temperature': temperature, 'functions': functions_key}
+        exact_key = _digest({**settings, 'messages': normalized})
+        prefix_key = _digest({**settings, 'messages': normalized[:-1]})
+        return exact_key, prefix_key, normalized[-1]['content'] if normalized else ''
+
+    def _replayable(self, response: Dict[str, Any]) -> bool:
+        function_call = response.get('function_call')
+        return not function_call or function_call.get('name') in self.semantic_functions
+
+    def _embed(self, text: str):
+        with self._encoder_lock:
+            if self._encoder is None:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(self.semantic_model, device='cpu')
+        return self._encoder.encode(text, normalize_embeddings=True)
+
+    def get(self, messages: List[Dict[str, Any]], model: str, temperature: float, functions_key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response for the request, or None."""
+        exact_key, prefix_key, last = self._keys(messages, model, temperature, functions_key)
+        response = self._exact.get(exact_key)
+        if response is not None or not self.semantic:
+            return response
+
+        neighbours = self._neighbours.get(prefix_key)
+        if not neighbours:
+            return None
+        try:
+            embedding = self._embed(last)
+        except Exception as e:
+            print(f"Error embedding prompt for response cache: {str(e)}")
+            return None
+        best_score, best_key = max(((float(embedding @ other), key) for other, key in neighbours), key=lambda pair: pair[0])
+        if best_score < self.semantic_threshold:
+            return None
+        response = self._exact.peek(best_key)
+        if response is None or not self._replayable(response):
+            return None
+        self.semantic_hits += 1
+        return response
+
+    def set(self, messages: List[Dict[str, Any]], model: str, temperature: float, functions_key: str, response: Dict[str, Any]) -> None:
+        """Store the response for a request."""
+        exact_key, prefix_key, last = self._keys(messages, model, temperature, functions_key)
+        self._exact.set(exact_key, response)
+        if not self.semantic or not self._replayable(response):
+            return
+        try:
+            embedding = self._embed(last)
+        except Exception as e:
+            print(f"Error embedding prompt for response cache: {str(e)}")
+            return
+        neighbours = [n for n in (self._neighbours.get(prefix_key) or []) if n[1] != exact_key]
+        self._neighbours.set(prefix_key, (neighbours + [(embedding, exact_key)])[-50:])
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit and miss counters."""
+        stats = self._exact.stats()
+        return {
+            'hits': stats['hits'],
+            'misses': stats['misses'] - self.semantic_hits,
+            'semantic_hits': self.semantic_hits,
+            'size': stats['size']
+        }
+
+# Create a singleton instance
+response_cache = ResponseCache(
+    max_size=int(os.getenv('RESPONSE_CACHE_MAX_SIZE', '1000')),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '3600')),
+    semantic=os.getenv('RESPONSE_CACHE_SEMANTIC', 'false').lower() == 'true',
+    semantic_threshold=float(os.getenv('RESPONSE_CACHE_SEMANTIC_THRESHOLD', '0.95'))
+)
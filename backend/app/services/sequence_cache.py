@@ -0,0 +1,92 @@
+import os
+import copy
+import json
+from typing import Callable, Dict, Any, Optional
+from app.utils.cache import TTLCache, get_shared_backend
+
+Loader = Callable[[str], Optional[Dict[str, Any]]]
+
+
+class SequenceCache:
+    """Read-through cache of sequence rows keyed by id.
+
+    Writes go through ``SequenceService``, which stores the row it gets back
+    or drops the entry on delete. Each entry remembers the row's
+    ``updated_at``, and an entry is never replaced by an older version, so a
+    slow read that raced a write cannot put stale data back. Callers get a
+    copy and may mutate it freely. When a shared backend is configured the
+    entries live there and every worker sees the same invalidations; if it
+    is unreachable, reads go to the database.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 300.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = TTLCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def _key(sequence_id: str) -> str:
+        return f"sequence:{sequence_id}"
+
+    def _cached(self, sequence_id: str) -> Optional[Dict[str, Any]]:
+        backend = get_shared_backend()
+        if backend is None:
+            return self._local.get(sequence_id)
+        try:
+            cached = backend.get(self._key(sequence_id))
+        except Exception as e:
+            # The shared cache is unreachable; treat it as a miss
+            print(f"Error reading sequence cache: {str(e)}")
+            return None
+        return json.loads(cached) if cached else None
+
+    def get(self, sequence_id: str, loader: Loader) -> Optional[Dict[str, Any]]:
+        """Return the sequence, loading and caching it on a miss."""
+        sequence = self._cached(sequence_id)
+        if sequence is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            sequence = loader(sequence_id)
+            if sequence is None:
+                return None
+            self.set(sequence)
+        return copy.deepcopy(sequence)
+
+    def set(self, sequence: Dict[str, Any]) -> None:
+        """Store a sequence row unless a newer version is already cached."""
+        cached = self._cached(sequence['id'])
+        if cached and (cached.get('updated_at') or '') > (sequence.get('updated_at') or ''):
+            return
+        backend = get_shared_backend()
+        if backend is None:
+            self._local.set(sequence['id'], copy.deepcopy(sequence))
+            return
+        try:
+            backend.set(self._key(sequence['id']), json.dumps(sequence, default=str), ex=int(self.ttl))
+        except Exception as e:
+            print(f"Error writing sequence cache: {str(e)}")
+
+    def invalidate(self, sequence_id: str) -> None:
+        """Forget a sequence, e.g. after it was deleted."""
+        backend = get_shared_backend()
+        if backend is None:
+            self._local.delete(sequence_id)
+            return
+        try:
+            backend.delete(self._key(sequence_id))
+        except Exception as e:
+            print(f"Error invalidating sequence cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit and miss counters for this worker, and the size of a local cache."""
+        if get_shared_backend() is not None:
+            return {'hits': self.hits, 'misses': self.misses, 'backend': 'shared'}
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._local)}
+
+# Create a singleton instance
+sequence_cache = SequenceCache(
+    max_size=int(os.getenv('SEQUENCE_CACHE_MAX_SIZE', '1000')),
+    ttl=float(os.getenv('SEQUENCE_CACHE_TTL_SECONDS', '300'))
+)
@@ -1,12 +1,96 @@
 from datetime import datetime, timedelta
 import uuid
-import json
 import os
-from typing import Dict, List, Any, Optional
+import json
+import base64
+from typing import Dict, List, Any, Optional, Iterator, Tuple
 from app.config.supabase import supabase, SEQUENCES_TABLE
+from app.services.bulk_insert import insert_in_chunks, queue_row_id
 from app.services.email_service import email_service
+from app.services.step_template_service import step_template_service
+from app.services.recipient_store import recipient_store, validate_segment
+from app.services.suppression_index import suppression_index
+from app.services.sequence_cache import sequence_cache
 from threading import Thread
 
+QUEUE_INSERT_CHUNK_SIZE = int(os.getenv('EMAIL_QUEUE_INSERT_CHUNK_SIZE', '500'))
+
+# 'eager' queues every step up front; 'lazy' queues only the next step per recipient
+SCHEDULING_MODE = os.getenv('SEQUENCE_SCHEDULING_MODE', 'eager').lower()
+
+# Columns returned by list_sequences(summary=True); step_count is a computed column
+SEQUENCE_SUMMARY_COLUMNS = 'id, title, status, is_active, step_count, created_at, updated_at'
+
+# Total-count modes accepted by list_sequences
+SEQUENCE_COUNT_MODES = ('exact', 'planned', 'estimated')
+
+def _encode_cursor(created_at: str, sequence_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, sequence_id]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, sequence_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        # Re-serialize both values so nothing but a timestamp and a UUID reaches the filter
+        created_at = datetime.fromisoformat(str(created_at).replace('Z', '+00:00')).isoformat()
+        return created_at, str(uuid.UUID(str(sequence_id)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# Operations accepted by SequenceService.patch_sequence
+SEQUENCE_OPERATIONS = (
+    'replace_content', 'set_step_title', 'set_delay', 'insert_step', 'remove_step',
+    'set_title', 'set_description'
+)
+
+def apply_sequence_operations(sequence: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply patch operations to a sequence and return only the changed fields."""
+    steps = [dict(step) for step in sequence.get('steps') or []]
+    changes: Dict[str, Any] = {}
+
+    def find(step_number):
+        for index, step in enumerate(steps):
+            if step.get('step_number') == step_number:
+                return index
+        raise ValueError(f"Step {step_number} not found")
+
+    for operation in operations:
+        op = operation.get('op')
+        if op not in SEQUENCE_OPERATIONS:
+            raise ValueError(f"Unknown operation: {op}")
+
+        if op in ('set_title', 'set_description'):
+            field = 'title' if op == 'set_title' else 'description'
+            if operation.get('value') != sequence.get(field):
+                changes[field] = operation.get('value')
+            continue
+
+        step_number = operation.get('step_number')
+        if op == 'insert_step':
+            position = len(steps) if step_number is None else max(0, min(int(step_number) - 1, len(steps)))
+            steps.insert(position, {
+                'step_number': position + 1,
+                'type': operation.get('type', 'email'),
+                'step_title': operation.get('step_title', ''),
+                'content': operation.get('content', ''),
+                'delay_days': int(operation.get('delay_days', 1))
+            })
+        elif op == 'remove_step':
+            steps.pop(find(step_number))
+        elif op == 'replace_content':
+            steps[find(step_number)]['content'] = operation.get('content', '')
+        elif op == 'set_step_title':
+            steps[find(step_number)]['step_title'] = operation.get('step_title', '')
+        elif op == 'set_delay':
+            steps[find(step_number)]['delay_days'] = int(operation.get('delay_days', 0))
+
+        if op in ('insert_step', 'remove_step'):
+            for index, step in enumerate(steps, 1):
+                step['step_number'] = index
+
+    if steps != (sequence.get('steps') or []):
+        changes['steps'] = steps
+    return changes
+
 class SequenceService:
     @staticmethod
     def create_sequence(
@@ -14,7 +98,8 @@ class SequenceService:
         description: str,
         steps: List[Dict[str, Any]],
         metadata: Optional[Dict[str, Any]] = None,
-        status: str = 'DRAFT'
+        status: str = 'DRAFT',
+        segment: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Create a new sequence."""
         try:
@@ -25,6 +110,7 @@ class SequenceService:
                 'description': description,
                 'steps': steps,
                 'metadata': metadata or {},
+                'segment': segment,
                 'is_active': False,
                 'status': status,
                 'created_at': datetime.utcnow().isoformat(),
@@ -34,10 +120,45 @@ class SequenceService:
             result = supabase.table(SEQUENCES_TABLE).insert(sequence).execute()
             if not result.data:
                 raise Exception("Failed to create sequence")
+            sequence_cache.set(result.data[0])
             return result.data[0]
         except Exception as e:
             raise Exception(f"Error creating sequence: {str(e)}")
 
+    @staticmethod
+    def create_sequences(drafts: List[Dict[str, Any]], status: str = 'DRAFT') -> List[Dict[str, Any]]:
+        """Create many sequences in a single insert.
+
+        Each draft needs ``title``, ``description`` and ``steps`` and may carry
+        ``metadata``. Returns the created rows in the order of ``drafts``.
+        """
+        try:
+            now = datetime.utcnow().isoformat()
+            sequences = [{
+                'id': str(uuid.uuid4()),
+                'title': draft['title'],
+                'description': draft['description'],
+                'steps': draft['steps'],
+                'metadata': draft.get('metadata') or {},
+                'segment': draft.get('segment'),
+                'is_active': False,
+                'status': status,
+                'created_at': now,
+                'updated_at': now
+            } for draft in drafts]
+            if not sequences:
+                return []
+
+            result = supabase.table(SEQUENCES_TABLE).insert(sequences).execute()
+            if len(result.data) != len(sequences):
+                raise Exception("Failed to create sequences")
+            by_id = {row['id']: row for row in result.data}
+            for row in result.data:
+                sequence_cache.set(row)
+            return [by_id[sequence['id']] for sequence in sequences]
+        except Exception as e:
+            raise Exception(f"Error creating sequences: {str(e)}")
+
     @staticmethod
     def update_sequence(
         sequence_id: str,
@@ -50,29 +171,26 @@ class SequenceService:
                 del updates['id']
             # Add updated_at timestamp
             updates['updated_at'] = datetime.utcnow().isoformat()
+            # Activating queues emails, so the sequence counts as published from then on
+            if updates.get('is_active') is True:
+                updates.setdefault('status', 'ACTIVE')
             
+            result = supabase.table(SEQUENCES_TABLE)\
+                .update(updates)\
+                .eq('id', sequence_id)\
+                .execute()
+                
+            if not result.data:
+                raise Exception("Failed to update sequence")
+            sequence = result.data[0]
+            sequence_cache.set(sequence)
+
             # If sequence is being activated, queue the first email in background
             if updates.get('is_active') is True:
                 def queue_emails_background():
                     try:
-                        sequence = SequenceService.get_sequence(sequence_id)
-                        if sequence and sequence.get('steps'):
-                            for step in sequence['steps']:
-                                users = get_all_users()
-                                for user in users:
-                                    print(f"Queueing email for user {user['email']}")
-                                    email_service.queue_email(
-                                        sequence_id=sequence_id,
-                                        step_number=step.get('step_number', 1),
-                                        to_email=user['email'],
-                                        subject=step.get('step_title', ''),
-                                        content=step.get('content', ''),
-                                        delay_days=int(step.get('delay_days', 1)),
-                                        user_first_name=user['first_name'],
-                                        user_last_name=user['last_name'],
-                                        user_title=user['title'],
-                                        user_location=user['location']
-                                    )
+                        if sequence.get('steps'):
+                            _queue_sequence(sequence)
                     except Exception as e:
                         print(f"Error in background email queueing: {str(e)}")
                 
@@ -80,29 +198,37 @@ class SequenceService:
                 thread = Thread(target=queue_emails_background)
                 thread.daemon = True
                 thread.start()
-            
-            result = supabase.table(SEQUENCES_TABLE)\
-                .update(updates)\
-                .eq('id', sequence_id)\
-                .execute()
-                
-            if not result.data:
-                raise Exception("Failed to update sequence")
-            return result.data[0]
+
+            if 'is_active' in updates or 'status' in updates:
+                suppression_index.track_sequence(sequence)
+            return sequence
         except Exception as e:
             raise Exception(f"Error updating sequence: {str(e)}")
 
+    @staticmethod
+    def patch_sequence(sequence_id: str, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply patch operations and persist only the fields they changed.
+
+        The operations are applied to the row as stored, not to a cached
+        copy that another worker may have updated since.
+        """
+        sequence = _load_sequence(sequence_id)
+        if not sequence:
+            raise Exception("Sequence not found")
+        changes = apply_sequence_operations(sequence, operations)
+        if not changes:
+            return sequence
+        return SequenceService.update_sequence(sequence_id, changes)
+
     @staticmethod
     def get_sequence(sequence_id: str) -> Optional[Dict[str, Any]]:
-        """Get a sequence by ID."""
+        """Get a sequence by ID, or None if it does not exist.
+
+        Reads go through the sequence cache; the database is only queried on
+        a miss.
+        """
         try:
-            result = supabase.table(SEQUENCES_TABLE)\
-                .select('*')\
-                .eq('id', sequence_id)\
-                .single()\
-                .execute()
-                
-            return result.data if result.data else None
+            return sequence_cache.get(sequence_id, _load_sequence)
         except Exception as e:
             raise Exception(f"Error getting sequence: {str(e)}")
 
@@ -111,23 +237,52 @@ class SequenceService:
         limit: int = 10,
         offset: int = 0,
         active_only: bool = True,
-        status: Optional[str] = None
-    ) -> List[Dict[str, Any]]:
-        """List sequences with optional filtering."""
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        summary: bool = False,
+        count: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """List sequences newest first, with optional filtering.
+
+        Pass the returned ``next_cursor`` back as ``cursor`` to page by
+        ``(created_at, id)`` instead of by offset. ``summary`` returns only
+        the fields a list view needs, with a ``step_count`` in place of the
+        steps. ``count`` ('exact', 'planned' or 'estimated') adds a ``total``.
+        """
+        if count and count not in SEQUENCE_COUNT_MODES:
+            raise ValueError(f"count must be one of: {', '.join(SEQUENCE_COUNT_MODES)}")
+        after = _decode_cursor(cursor) if cursor else None
         try:
-            query = supabase.table(SEQUENCES_TABLE)\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .limit(limit)\
-                .offset(offset)
-                
+            columns = SEQUENCE_SUMMARY_COLUMNS if summary else '*'
+            query = supabase.table(SEQUENCES_TABLE).select(columns, count=count) if count \
+                else supabase.table(SEQUENCES_TABLE).select(columns)
+
             if active_only:
                 query = query.eq('is_active', True)
             if status:
                 query = query.eq('status', status)
-                
+            if after:
+                created_at, sequence_id = after
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{sequence_id})'
+                )
+
+            query = query\
+                .order('created_at', desc=True)\
+                .order('id', desc=True)\
+                .limit(limit)
+            if offset and not after:
+                query = query.offset(offset)
+
             result = query.execute()
-            return result.data
+            page = {'sequences': result.data, 'next_cursor': None}
+            if len(result.data) == limit:
+                last = result.data[-1]
+                page['next_cursor'] = _encode_cursor(last['created_at'], last['id'])
+            if count:
+                page['total'] = result.count
+            return page
         except Exception as e:
             raise Exception(f"Error listing sequences: {str(e)}")
         
@@ -143,53 +298,190 @@ class SequenceService:
                 
             if not result.data:
                 raise Exception("Failed to delete sequence")
+            sequence_cache.invalidate(sequence_id)
                 
             # Delete associated email queue entries
             supabase.table('email_queue')\
                 .delete()\
                 .eq('sequence_id', sequence_id)\
                 .execute()
+            suppression_index.forget_sequence(sequence_id)
                 
         except Exception as e:
             raise Exception(f"Error deleting sequence: {str(e)}")
 
-def get_all_users() -> List[Dict[str, Any]]:
-    """Get all users from the JSON file."""
-    try:
-        users_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'users.json')
-        with open(users_file, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        raise Exception(f"Error reading users: {str(e)}")
+def _earliest_send_time(steps: List[Dict[str, Any]], default_delay: int = 0) -> datetime:
+    """Return when the first email of a freshly queued sequence becomes due."""
+    delays = [int(step.get('delay_days', default_delay)) for step in steps]
+    return datetime.utcnow() + timedelta(days=min(delays, default=0))
+
+def _load_sequence(sequence_id: str) -> Optional[Dict[str, Any]]:
+    result = supabase.table(SEQUENCES_TABLE).select('*').eq('id', sequence_id).execute()
+    return result.data[0] if result.data else None
 
 def get_sequence(sequence_id: str) -> Dict[str, Any]:
-    """Get a sequence by ID."""
-    try:
-        result = supabase.table('sequences').select('*').eq('id', sequence_id).execute()
-        if not result.data:
-            raise Exception(f"Sequence with ID {sequence_id} not found")
-        return result.data[0]
-    except Exception as e:
-        raise Exception(f"Error getting sequence: {str(e)}")
+    """Get a sequence by ID, raising if it does not exist."""
+    sequence = SequenceService.get_sequence(sequence_id)
+    if not sequence:
+        raise Exception(f"Error getting sequence: Sequence with ID {sequence_id} not found")
+    return sequence
 
-def update_sequence_status(sequence_id: str, status: str) -> Dict[str, Any]:
-    """Update sequence status."""
+def update_sequence_status(sequence_id: str, status: str, is_active: Optional[bool] = None) -> Dict[str, Any]:
+    """Update sequence status, and optionally whether it is sending."""
     try:
+        updates = {'status': status, 'updated_at': datetime.utcnow().isoformat()}
+        if is_active is not None:
+            updates['is_active'] = is_active
         result = supabase.table('sequences')\
-            .update({'status': status, 'updated_at': datetime.utcnow().isoformat()})\
+            .update(updates)\
             .eq('id', sequence_id)\
             .execute()
         if not result.data:
             raise Exception(f"Failed to update sequence status")
+        sequence_cache.set(result.data[0])
+        suppression_index.track_sequence(result.data[0])
         return result.data[0]
     except Exception as e:
         raise Exception(f"Error updating sequence status: {str(e)}")
 
+def audience_size(segment: Optional[Dict[str, Any]]) -> int:
+    """Count the recipients a segment selects without materializing them."""
+    return recipient_store.count(validate_segment(segment))
+
+def _step_templates(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build step templates numbered by position in the sequence."""
+    return [{
+        'step_number': step_number,
+        'subject': step.get('subject') or step.get('step_title', ''),
+        'content': step.get('content', ''),
+        'delay_days': int(step.get('delay_days', 1))
+    } for step_number, step in enumerate(steps, 1)]
+
+def _templates_to_queue(templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the templates materialized now; lazy mode only queues the first step."""
+    return templates[:1] if SCHEDULING_MODE == 'lazy' else templates
+
+def _queue_rows(
+    sequence_id: str,
+    templates: List[Dict[str, Any]],
+    segment: Optional[Dict[str, Any]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Yield compact queue rows for the queued steps of every user in the segment.
+
+    Rows reference the saved step template by version and carry only the
+    recipient's variables; the body is rendered at send time. In lazy mode
+    only the first step is queued and flagged ``schedule_next``.
+    """
+    suppression_index.refresh()
+    step_count = len(templates)
+    templates = _templates_to_queue(templates)
+    current_time = datetime.utcnow()
+    for user in recipient_store.iter_users(validate_segment(segment)):
+        if not user.get('email'):
+            print(f"Skipping user {user.get('first_name')} {user.get('last_name')} - no email address")
+            continue
+        if suppression_index.is_suppressed(user['email']):
+            continue
+
+        template_vars = {
+            'first_name': user.get('first_name') or '',
+            'last_name': user.get('last_name') or '',
+            'email': user['email'],
+            'title': user.get('title') or '',
+            'location': user.get('location') or ''
+        }
+        for template in templates:
+            scheduled_time = current_time + timedelta(days=template['delay_days'])
+            yield {
+                'id': queue_row_id(sequence_id, template['step_number'], user['email']),
+                'sequence_id': sequence_id,
+                'step_number': template['step_number'],
+                'to_email': user['email'],
+                'template_version': template['version'],
+                'template_vars': template_vars,
+                'scheduled_time': scheduled_time.isoformat(),
+                'status': 'PENDING',
+                'created_at': current_time.isoformat(),
+                'schedule_next': len(templates) < step_count
+            }
+
+def schedule_next_steps(sent: List[Tuple[Dict[str, Any], datetime]]) -> int:
+    """Queue the following step for lazily scheduled rows that were just sent.
+
+    Each next step is due ``delay_days`` after the real send time of the
+    previous one and uses the sequence's current content, so edits made
+    while a sequence runs apply to steps not yet queued. Sequences that are
+    no longer active or have been deleted are not advanced.
+    """
+    by_sequence: Dict[str, List[Tuple[Dict[str, Any], datetime]]] = {}
+    for email, sent_at in sent:
+        by_sequence.setdefault(email['sequence_id'], []).append((email, sent_at))
+
+    queued = 0
+    for sequence_id, emails in by_sequence.items():
+        try:
+            sequence = get_sequence(sequence_id)
+        except Exception as e:
+            print(f"Not scheduling next steps for sequence {sequence_id}: {str(e)}")
+            continue
+        if not sequence.get('is_active'):
+            continue
+
+        templates = _step_templates(sequence.get('steps') or [])
+        next_templates = {}
+        rows = []
+        for email, sent_at in emails:
+            step_number = email['step_number'] + 1
+            if step_number > len(templates) or suppression_index.is_suppressed(email['to_email']):
+                continue
+            template = templates[step_number - 1]
+            next_templates[step_number] = template
+            rows.append({
+                'id': queue_row_id(sequence_id, step_number, email['to_email']),
+                'sequence_id': sequence_id,
+                'step_number': step_number,
+                'to_email': email['to_email'],
+                'template_vars': email.get('template_vars') or {},
+                'scheduled_time': (sent_at + timedelta(days=template['delay_days'])).isoformat(),
+                'status': 'PENDING',
+                'created_at': datetime.utcnow().isoformat(),
+                'schedule_next': step_number < len(templates)
+            })
+        if not rows:
+            continue
+
+        step_template_service.save(sequence_id, list(next_templates.values()))
+        for row in rows:
+            row['template_version'] = next_templates[row['step_number']]['version']
+        queued += insert_in_chunks('email_queue', rows, chunk_size=QUEUE_INSERT_CHUNK_SIZE)
+        email_service.notify_queued(min(datetime.fromisoformat(row['scheduled_time']) for row in rows))
+    if queued:
+        print(f"Scheduled {queued} follow-up emails")
+    return queued
+
+def _queue_sequence(sequence: Dict[str, Any]) -> int:
+    """Save the templates of the steps queued now, bulk insert every recipient's rows and wake the scheduler."""
+    sequence_id = sequence['id']
+    templates = _step_templates(sequence['steps'])
+    step_template_service.save(sequence_id, _templates_to_queue(templates))
+    queued = insert_in_chunks(
+        'email_queue',
+        _queue_rows(sequence_id, templates, sequence.get('segment')),
+        chunk_size=QUEUE_INSERT_CHUNK_SIZE,
+        on_progress=lambda n: print(f"Queued {n} emails for sequence {sequence_id}")
+    )
+    print(f"Finished queueing {queued} emails for sequence {sequence_id}")
+    email_service.notify_queued(_earliest_send_time(_templates_to_queue(templates)))
+    return queued
+
 def queue_sequence_emails(sequence_id: str) -> None:
     """Queue emails for all users in the sequence."""
     try:
         print(f"Starting to queue emails for sequence {sequence_id}")
-        sequence = get_sequence(sequence_id)
+        # Queue from the stored row rather than a possibly stale cached copy
+        sequence = _load_sequence(sequence_id)
+        if not sequence:
+            raise Exception(f"Sequence with ID {sequence_id} not found")
         print(f"Found sequence: {sequence}")
         
         if not sequence.get('steps'):
@@ -206,57 +498,18 @@ def queue_sequence_emails(sequence_id: str) -> None:
             if 'subject' not in step:
                 raise Exception("Each step must have a 'subject' field")
             
-        users = get_all_users()
-        print(f"Found {len(users)} users")
-        
-        current_time = datetime.utcnow()
-        
-        for user in users:
-            if not user.get('email'):
-                print(f"Skipping user {user.get('first_name')} {user.get('last_name')} - no email address")
-                continue
-                
-            print(f"Processing user: {user['email']}")
-            
-            for step_number, step in enumerate(sequence['steps'], 1):
-                scheduled_time = current_time + timedelta(days=step.get('delay_days', 0))
-                
-                # Replace placeholders in content
-                content = step.get('content', '')
-                content = content.replace('{first_name}', user['first_name'])
-                content = content.replace('{last_name}', user['last_name'])
-                content = content.replace('{title}', user.get('title', ''))
-                content = content.replace('{location}', user.get('location', ''))
-                
-                email_data = {
-                    'sequence_id': sequence_id,
-                    'step_number': step_number,
-                    'to_email': user['email'],
-                    'subject': step.get('subject', ''),
-                    'content': content,
-                    'scheduled_time': scheduled_time.isoformat(),
-                    'status': 'PENDING',
-                    'created_at': current_time.isoformat(),
-                    'updated_at': current_time.isoformat()
-                }
-                
-                print(f"Queueing email for step {step_number}: {email_data}")
-                
-                result = supabase.table('email_queue').insert(email_data).execute()
-                if not result.data:
-                    raise Exception(f"Failed to queue email for user {user['email']}")
-                print(f"Successfully queued email for {user['email']}")
+        _queue_sequence(sequence)
                     
     except Exception as e:
         print(f"Error in queue_sequence_emails: {str(e)}")
         raise Exception(f"Error queueing sequence emails: {str(e)}")
 
 def publish_sequence(sequence_id: str) -> Dict[str, Any]:
-    """Publish a sequence and queue emails for all users."""
+    """Publish a sequence and queue emails for every user in its segment."""
     try:
         print(f"Starting to publish sequence {sequence_id}")
         # Update sequence status to ACTIVE
-        sequence = update_sequence_status(sequence_id, 'ACTIVE')
+        sequence = update_sequence_status(sequence_id, 'ACTIVE', is_active=True)
         print(f"Updated sequence status to ACTIVE: {sequence}")
         
         # Queue emails for all users
@@ -266,9 +519,16 @@ def publish_sequence(sequence_id: str) -> Dict[str, Any]:
         return sequence
     except Exception as e:
         print(f"Error in publish_sequence: {str(e)}")
-        # If anything fails, set status back to DRAFT
-        update_sequence_status(sequence_id, 'DRAFT')
+        # If anything fails, drop what was queued and set status back to DRAFT
+        supabase.table('email_queue')\
+            .delete()\
+            .eq('sequence_id', sequence_id)\
+            .execute()
+        update_sequence_status(sequence_id, 'DRAFT', is_active=False)
         raise Exception(f"Error publishing sequence: {str(e)}")
 
 # Create a singleton instance
 sequence_service = SequenceService()
+
+# Sent rows flagged schedule_next advance their recipient to the next step
+email_service.add_sent_listener(schedule_next_steps)
@@ -0,0 +1,169 @@
+import time
+import smtplib
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from typing import Dict, Any, Optional
+
+
+class SMTPConnectionPool:
+    """A pool of long-lived, authenticated SMTP sessions.
+
+    Connections are created lazily, reused across messages and retired once
+    they exceed the per-connection message cap or sit idle for too long.
+    """
+
+    def __init__(
+        self,
+        settings: Dict[str, Any],
+        max_size: int = 4,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 60.0,
+        health_check_interval: float = 15.0,
+        acquire_timeout: float = 30.0
+    ):
+        self._settings = settings
+        self.max_size = max_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self) -> Dict[str, Any]:
+        """Open, secure and authenticate a new SMTP session."""
+        server = smtplib.SMTP(self._settings['smtp_host'], self._settings['smtp_port'])
+        try:
+            server.starttls()
+            server.login(self._settings['smtp_username'], self._settings['smtp_password'])
+        except Exception:
+            self._close_server(server)
+            raise
+        now = time.monotonic()
+        return {'server': server, 'sent': 0, 'last_used': now, 'last_checked': now}
+
+    @staticmethod
+    def _close_server(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, conn: Dict[str, Any]) -> bool:
+        """Check that a pooled session can still be used."""
+        now = time.monotonic()
+        if now - conn['last_used'] > self.idle_timeout:
+            return False
+        if conn['sent'] >= self.max_messages_per_connection:
+            return False
+        if now - conn['last_checked'] > self.health_check_interval:
+            try:
+                code, _ = conn['server'].noop()
+            except Exception:
+                return False
+            conn['last_checked'] = now
+            return code == 250
+        return True
+
+    def _checkout(self) -> Dict[str, Any]:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError("Timed out waiting for an SMTP connection")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except Empty:
+                    return self._connect()
+                if self._is_healthy(conn):
+                    return conn
+                self._close_server(conn['server'])
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: Optional[Dict[str, Any]], broken: bool = False) -> None:
+        try:
+            if conn is None:
+                return
+            if broken or conn['sent'] >= self.max_messages_per_connection:
+                self._close_server(conn['server'])
+            else:
+                conn['last_used'] = time.monotonic()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow an authenticated SMTP session from the pool.
+
+        A session is only discarded when the error means it is gone. After a
+        per-message failure, such as a refused recipient or a rejected body,
+        the transaction is reset and the session goes back to the pool.
+        """
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = self._is_broken(e) or not self._reset(conn['server'])
+            raise
+        finally:
+            self._checkin(conn, broken=broken)
+
+    @staticmethod
+    def _is_broken(error: Exception) -> bool:
+        """Whether an error means the session itself can no longer be used."""
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code == 421
+        # SMTPException subclasses OSError, so only plain socket errors count
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    @staticmethod
+    def _reset(server: smtplib.SMTP) -> bool:
+        """Abort the current mail transaction and report whether the session survived."""
+        try:
+            code, _ = server.rset()
+        except Exception:
+            return False
+        return code == 250
+
+    @staticmethod
+    def _should_reconnect(error: Exception) -> bool:
+        """Whether an error means the session is gone and a retry may succeed."""
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        # SMTPException subclasses OSError, so only retry plain socket errors
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    def send_message(self, msg, retries: int = 1) -> None:
+        """Send a message, reconnecting on dropped sessions and 4xx/421 replies."""
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    conn['server'].send_message(msg)
+                    conn['sent'] += 1
+                return
+            except Exception as e:
+                if attempt >= retries or not self._should_reconnect(e):
+                    raise
+                attempt += 1
+                print(f"SMTP session failed ({str(e)}), reconnecting (attempt {attempt})")
+
+    def ping(self) -> bool:
+        """Verify that a healthy, authenticated session is available.
+
+        Checkout already health-checks stale sessions, so repeated pings within
+        the health check interval cost no network round-trip.
+        """
+        with self.connection():
+            return True
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Tuple
+from app.config.supabase import supabase
+from app.utils.templates import template_cache, CompiledTemplate
+
+STEP_TEMPLATES_TABLE = 'sequence_step_templates'
+
+TemplateKey = Tuple[str, int, str]
+
+
+def template_version(subject: str, content: str) -> str:
+    """Derive a stable version for a step's subject and content."""
+    digest = hashlib.sha1(f"{subject}\x00{content}".encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+class StepTemplateService:
+    """Versioned step templates referenced by queue rows.
+
+    Queue rows carry ``(sequence_id, step_number, template_version)`` and a
+    small ``template_vars`` record instead of a full copy of the body. The
+    templates are written once per publish and rendered at send time.
+    """
+
+    def __init__(self, max_cached: int = 1024):
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[TemplateKey, Dict[str, str]]' = OrderedDict()
+
+    def _remember(self, key: TemplateKey, template: Dict[str, str]) -> None:
+        with self._lock:
+            self._cache[key] = template
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def save(self, sequence_id: str, templates: List[Dict[str, Any]]) -> None:
+        """Store step templates, ignoring versions that already exist.
+
+        Each template needs ``step_number``, ``subject`` and ``content``; its
+        ``version`` is derived from the subject and content.
+        """
+        now = datetime.utcnow().isoformat()
+        rows = []
+        for template in templates:
+            version = template_version(template['subject'], template['content'])
+            template['version'] = version
+            rows.append({
+                'sequence_id': sequence_id,
+                'step_number': template['step_number'],
+                'version': version,
+                'subject': template['subject'],
+                'content': template['content'],
+                'created_at': now
+            })
+            self._remember(
+                (sequence_id, template['step_number'], version),
+                {'subject': template['subject'], 'content': template['content']}
+            )
+        if rows:
+            supabase.table(STEP_TEMPLATES_TABLE)\
+                .upsert(rows, on_conflict='sequence_id,step_number,version', ignore_duplicates=True)\
+                .execute()
+
+    def prefetch(self, emails: Iterable[Dict[str, Any]]) -> None:
+        """Load every template referenced by a page of queue rows in one request."""
+        with self._lock:
+            missing = {
+                (email['sequence_id'], email['step_number'], email['template_version'])
+                for email in emails
+                if email.get('template_version')
+            } - set(self._cache)
+        if not missing:
+            return
+
+        result = supabase.table(STEP_TEMPLATES_TABLE)\
+            .select('sequence_id, step_number, version, subject, content')\
+            .in_('sequence_id', list({key[0] for key in missing}))\
+            .in_('version', list({key[2] for key in missing}))\
+            .execute()
+        for row in result.data:
+            key = (row['sequence_id'], row['step_number'], row['version'])
+            if key in missing:
+                self._remember(key, {'subject': row['subject'], 'content': row['content']})
+
+    def get(self, sequence_id: str, step_number: int, version: str) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        """Return the compiled subject and content templates for a step version."""
+        key = (sequence_id, step_number, version)
+        with self._lock:
+            template = self._cache.get(key)
+        if template is None:
+            result = supabase.table(STEP_TEMPLATES_TABLE)\
+                .select('subject, content')\
+                .eq('sequence_id', sequence_id)\
+                .eq('step_number', step_number)\
+                .eq('version', version)\
+                .execute()
+            if not result.data:
+                raise Exception(f"Step template {sequence_id}/{step_number}@{version} not found")
+            template = result.data[0]
+            self._remember(key, template)
+        return template_cache.get(template['subject']), template_cache.get(template['content'])
+
+    def render(self, email: Dict[str, Any]) -> Tuple[str, str]:
+        """Render the subject and content of a deferred queue row."""
+        subject, content = self.get(email['sequence_id'], email['step_number'], email['template_version'])
+        values = email.get('template_vars') or {}
+        return subject.render(values), content.render(values)
+
+# Create a singleton instance
+step_template_service = StepTemplateService()
@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Set
+from app.config.supabase import supabase, SEQUENCES_TABLE
+
+SUPPRESSIONS_TABLE = 'email_suppressions'
+
+# Screening results for a queue row
+SUPPRESSED = 'SUPPRESSED'
+PAUSED = 'PAUSED'
+
+# Rows written within this window before a refresh are read again next time
+_REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def _is_paused(sequence: Dict[str, Any]) -> bool:
+    """Whether a sequence was published and then deactivated; drafts have no queued rows."""
+    return sequence.get('status') == 'ACTIVE' and not sequence.get('is_active')
+
+
+class SuppressionIndex:
+    """In-memory index of suppressed addresses and paused sequences.
+
+    The index is loaded once and then refreshed incrementally from rows
+    created or updated since the previous refresh. Queue processing screens
+    every row against it, so pausing a sequence or suppressing an address
+    takes effect without rewriting queued rows. Deleted sequences need no
+    entry, as their queued rows are deleted with them.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0, page_size: int = 1000):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._suppressed: Set[str] = set()
+        self._paused: Set[str] = set()
+        self._suppressions_since: Optional[str] = None
+        self._sequences_since: Optional[str] = None
+        self._refreshed_at = 0.0
+
+    def _fetch_all(self, build_query) -> List[Dict[str, Any]]:
+        rows = []
+        start = 0
+        while True:
+            page = build_query().range(start, start + self.page_size - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
+
+    def refresh(self, force: bool = False) -> None:
+        """Pull suppressions and sequence state changed since the last refresh."""
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        started = (datetime.utcnow() - _REFRESH_OVERLAP).isoformat()
+
+        def suppressions_query():
+            query = supabase.table(SUPPRESSIONS_TABLE).select('email')
+            if self._suppressions_since:
+                query = query.gte('created_at', self._suppressions_since)
+            return query.order('email')
+
+        def sequences_query():
+            query = supabase.table(SEQUENCES_TABLE).select('id, status, is_active')
+            if self._sequences_since:
+                query = query.gte('updated_at', self._sequences_since)
+            else:
+                # The first load only needs the sequences that are paused
+                query = query.eq('status', 'ACTIVE').eq('is_active', False)
+            return query.order('id')
+
+        try:
+            suppressions = self._fetch_all(suppressions_query)
+            sequences = self._fetch_all(sequences_query)
+        except Exception as e:
+            # Keep screening with the index as last loaded
+            print(f"Error refreshing suppression index: {str(e)}")
+            return
+        with self._lock:
+            self._suppressed.update(row['email'].lower() for row in suppressions if row.get('email'))
+            self._track(sequences)
+            self._suppressions_since = started
+            self._sequences_since = started
+            self._refreshed_at = time.monotonic()
+
+    def is_suppressed(self, email: str) -> bool:
+        return (email or '').lower() in self._suppressed
+
+    def is_paused(self, sequence_id: str) -> bool:
+        return sequence_id in self._paused
+
+    def screen(self, email: Dict[str, Any]) -> Optional[str]:
+        """Return ``SUPPRESSED`` or ``PAUSED`` when a queue row must not be sent, else None."""
+        if self.is_suppressed(email.get('to_email')):
+            return SUPPRESSED
+        if self.is_paused(email.get('sequence_id')):
+            return PAUSED
+        return None
+
+    def suppress(self, email: str, reason: str = 'unsubscribed') -> None:
+        """Suppress an address from now on, locally and for every other worker."""
+        email = email.strip().lower()
+        with self._lock:
+            self._suppressed.add(email)
+        supabase.table(SUPPRESSIONS_TABLE)\
+            .upsert({'email': email, 'reason': reason, 'created_at': datetime.utcnow().isoformat()},
+                    on_conflict='email', ignore_duplicates=True)\
+            .execute()
+
+    def _track(self, sequences: Iterable[Dict[str, Any]]) -> None:
+        for sequence in sequences:
+            if _is_paused(sequence):
+                self._paused.add(sequence['id'])
+            else:
+                self._paused.discard(sequence['id'])
+
+    def track_sequence(self, sequence: Dict[str, Any]) -> None:
+        """Apply a pause or resume from an updated sequence row without waiting for a refresh."""
+        with self._lock:
+            self._track([sequence])
+
+    def forget_sequence(self, sequence_id: str) -> None:
+        """Drop a deleted sequence from the index."""
+        with self._lock:
+            self._paused.discard(sequence_id)
+
+# Create a singleton instance
+suppression_index = SuppressionIndex(
+    refresh_interval=float(os.getenv('SUPPRESSION_REFRESH_SECONDS', '30'))
+)
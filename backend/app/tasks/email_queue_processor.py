@@ -1,17 +1,36 @@
-import time
+import heapq
 import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from app.config.supabase import supabase
 from app.services.email_service import email_service
+from app.services.suppression_index import suppression_index
 
 class EmailQueueProcessor:
-    def __init__(self, interval_minutes: int = 5):
+    """Event-driven email scheduler.
+
+    Due times for a bounded look-ahead window of pending emails are kept in
+    a min-heap. The processor sleeps until the earliest one is due, and
+    ``notify`` wakes it early when new rows are queued. The window is
+    reloaded every ``interval_minutes`` to pick up rows queued by other
+    processes.
+    """
+
+    def __init__(self, interval_minutes: int = 5, lookahead_limit: int = 1000):
         self.interval_minutes = interval_minutes
+        self.lookahead_limit = lookahead_limit
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._heap = []
+        self._next_refresh = datetime.min
         self._thread = None
 
     def start(self):
         """Start the email queue processor in a background thread."""
         if self._thread is None or not self._thread.is_alive():
             self._stop_event.clear()
+            self._next_refresh = datetime.min
             self._thread = threading.Thread(target=self._run)
             self._thread.daemon = True
             self._thread.start()
@@ -19,23 +38,78 @@ class EmailQueueProcessor:
     def stop(self):
         """Stop the email queue processor."""
         self._stop_event.set()
+        self._wake_event.set()
         if self._thread:
             self._thread.join()
             self._thread = None
 
+    def notify(self, scheduled_time: Optional[datetime] = None):
+        """Tell the scheduler that emails were queued for ``scheduled_time``."""
+        with self._lock:
+            heapq.heappush(self._heap, scheduled_time or datetime.utcnow())
+        self._wake_event.set()
+
+    def _refresh(self, now: datetime):
+        """Reload due times for the look-ahead window, ignoring paused sequences."""
+        horizon = now + timedelta(minutes=self.interval_minutes)
+        suppression_index.refresh()
+        result = supabase.table('email_queue')\
+            .select('scheduled_time, sequence_id')\
+            .eq('status', 'PENDING')\
+            .lte('scheduled_time', horizon.isoformat())\
+            .order('scheduled_time')\
+            .limit(self.lookahead_limit)\
+            .execute()
+
+        due_times = [
+            _parse_time(row['scheduled_time'])
+            for row in result.data
+            if not suppression_index.is_paused(row['sequence_id'])
+        ]
+        with self._lock:
+            self._heap = due_times
+            heapq.heapify(self._heap)
+        self._next_refresh = horizon
+
+    def _pop_due(self, now: datetime) -> bool:
+        """Drop every due entry from the heap and report whether any existed."""
+        due = False
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+                due = True
+        return due
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        with self._lock:
+            next_time = self._heap[0] if self._heap else self._next_refresh
+        next_time = min(next_time, self._next_refresh)
+        return max(0.0, (next_time - now).total_seconds())
+
     def _run(self):
         """Main loop for processing the email queue."""
         while not self._stop_event.is_set():
+            self._wake_event.clear()
             try:
-                email_service.process_email_queue()
+                now = datetime.utcnow()
+                if now >= self._next_refresh:
+                    email_service.reclaim_expired_leases()
+                    self._refresh(now)
+                if self._pop_due(now):
+                    email_service.process_email_queue()
             except Exception as e:
                 print(f"Error in email queue processor: {str(e)}")
-            
-            # Wait for the specified interval
-            for _ in range(self.interval_minutes * 60):
-                if self._stop_event.is_set():
-                    break
-                time.sleep(1)
+                self._next_refresh = datetime.utcnow() + timedelta(minutes=self.interval_minutes)
+
+            self._wake_event.wait(timeout=self._seconds_until_next(datetime.utcnow()))
+
+def _parse_time(value: str) -> datetime:
+    """Parse a Supabase timestamp into a naive UTC datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
 
 # Create a singleton instance
-email_queue_processor = EmailQueueProcessor() 
\ No newline at end of file
+email_queue_processor = EmailQueueProcessor()
+email_service.add_queue_listener(email_queue_processor.notify)
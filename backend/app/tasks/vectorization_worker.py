@@ -0,0 +1,79 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Set
+from app.config.supabase import supabase
+from app.services.document_index import document_index
+
+class VectorizationWorker:
+    """Background ingestion of folder files into the local vector indexes.
+
+    Folders with files still in ``processing`` are picked up every
+    ``interval_minutes``. Each folder sync only embeds new or changed
+    files.
+    """
+
+    def __init__(self, interval_minutes: int = 5):
+        self.interval_minutes = interval_minutes
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._next_scan = datetime.min
+        self._thread = None
+
+    def start(self):
+        """Start the vectorization worker in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._next_scan = datetime.min
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop the vectorization worker."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _scan(self, now: datetime):
+        """Queue every folder that has files waiting to be vectorized."""
+        result = supabase.table('files')\
+            .select('folder_id')\
+            .eq('status', 'processing')\
+            .execute()
+        with self._lock:
+            self._pending.update(row['folder_id'] for row in result.data if row.get('folder_id'))
+        self._next_scan = now + timedelta(minutes=self.interval_minutes)
+
+    def _next_folder(self) -> Optional[str]:
+        with self._lock:
+            return self._pending.pop() if self._pending else None
+
+    def _run(self):
+        """Main loop for syncing folder indexes."""
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            try:
+                now = datetime.utcnow()
+                if now >= self._next_scan:
+                    self._scan(now)
+                folder_id = self._next_folder()
+                while folder_id and not self._stop_event.is_set():
+                    counts = document_index.sync_folder(folder_id)
+                    print(f"Synced vector index for folder {folder_id}: {counts}")
+                    folder_id = self._next_folder()
+            except Exception as e:
+                print(f"Error in vectorization worker: {str(e)}")
+                self._next_scan = datetime.utcnow() + timedelta(minutes=self.interval_minutes)
+
+            timeout = max(0.0, (self._next_scan - datetime.utcnow()).total_seconds())
+            self._wake_event.wait(timeout=timeout)
+
+# Create a singleton instance
+vectorization_worker = VectorizationWorker(
+    interval_minutes=int(os.getenv('VECTORIZATION_INTERVAL_MINUTES', '5'))
+)
@@ -0,0 +1,39 @@
+import time
+import threading
+from collections import deque
+
+
+class RateLimiter:
+    """Sliding one-minute window limiting both requests and tokens.
+
+    A limit of 0 disables that dimension.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._tokens = 0
+
+    def _expire(self, now: float) -> None:
+        while self._events and now - self._events[0][0] >= 60:
+            _, tokens = self._events.popleft()
+            self._tokens -= tokens
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until a request costing ``tokens`` fits in the current window."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                requests_ok = not self.requests_per_minute or len(self._events) < self.requests_per_minute
+                # A single oversized request is let through once the window is empty
+                tokens_ok = not self.tokens_per_minute or not self._events \
+                    or self._tokens + tokens <= self.tokens_per_minute
+                if requests_ok and tokens_ok:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = 60 - (now - self._events[0][0])
+            time.sleep(max(wait, 0.01))
@@ -0,0 +1,133 @@
+import os
+import time
+import base64
+import hashlib
+import mimetypes
+import threading
+from typing import Dict, Optional
+import httpx
+from app.config.supabase import SUPABASE_URL, SUPABASE_KEY
+
+# Supabase's resumable endpoint requires every chunk but the last to be exactly 6MB
+CHUNK_SIZE = 6 * 1024 * 1024
+TUS_VERSION = '1.0.0'
+
+
+def file_sha256(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """Hash a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _metadata(values: Dict[str, str]) -> str:
+    return ','.join(f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}" for key, value in values.items())
+
+
+class ResumableUploader:
+    """Chunked uploads to Supabase Storage over the TUS protocol.
+
+    Files are streamed ``CHUNK_SIZE`` bytes at a time, so memory stays
+    bounded whatever the file size. Upload URLs are remembered per object,
+    and a failed chunk is retried from the offset the server reports, so a
+    transient error never restarts the upload from zero.
+    """
+
+    def __init__(self, base_url: str, key: str, max_retries: int = 3, timeout: float = 60.0):
+        self.endpoint = f"{base_url.rstrip('/')}/storage/v1/upload/resumable"
+        self.max_retries = max_retries
+        self._headers = {
+            'Authorization': f'Bearer {key}',
+            'apikey': key,
+            'Tus-Resumable': TUS_VERSION
+        }
+        self._client = httpx.Client(headers=self._headers, timeout=timeout)
+        self._lock = threading.Lock()
+        # (bucket, object name) -> upload URL of an unfinished upload
+        self._sessions: Dict[tuple, str] = {}
+
+    def _create(self, bucket: str, object_name: str, size: int, content_type: str) -> Optional[str]:
+        """Start an upload and return its URL, or None if the object already exists."""
+        response = self._client.post(self.endpoint, headers={
+            'Upload-Length': str(size),
+            'Upload-Metadata': _metadata({
+                'bucketName': bucket,
+                'objectName': object_name,
+                'contentType': content_type,
+                'cacheControl': '3600'
+            })
+        })
+        if response.status_code == 409:
+            return None
+        response.raise_for_status()
+        return response.headers['Location']
+
+    def _offset(self, upload_url: str) -> int:
+        response = self._client.head(upload_url)
+        response.raise_for_status()
+        return int(response.headers['Upload-Offset'])
+
+    def upload(self, bucket: str, object_name: str, file_path: str) -> bool:
+        """Upload a file and return False when the object was already stored."""
+        size = os.path.getsize(file_path)
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        key = (bucket, object_name)
+
+        with self._lock:
+            upload_url = self._sessions.get(key)
+        offset = 0
+        if upload_url:
+            try:
+                offset = self._offset(upload_url)
+            except httpx.HTTPError:
+                # The session expired or was finished elsewhere; start again
+                upload_url = None
+        if not upload_url:
+            upload_url = self._create(bucket, object_name, size, content_type)
+            if upload_url is None:
+                return False
+            with self._lock:
+                self._sessions[key] = upload_url
+
+        with open(file_path, 'rb') as f:
+            attempt = 0
+            while offset < size:
+                try:
+                    if attempt:
+                        # Resume from what the server actually stored
+                        offset = self._offset(upload_url)
+                        if offset >= size:
+                            break
+                    f.seek(offset)
+                    chunk = f.read(CHUNK_SIZE)
+                    response = self._client.patch(upload_url, content=chunk, headers={
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream'
+                    })
+                    response.raise_for_status()
+                    offset = int(response.headers.get('Upload-Offset', offset + len(chunk)))
+                    attempt = 0
+                except httpx.HTTPError as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise Exception(f"Failed to upload {object_name} at offset {offset}: {str(e)}")
+                    print(f"Retrying upload of {object_name} at offset {offset}: {str(e)}")
+                    time.sleep(min(2 ** attempt, 10))
+
+        with self._lock:
+            self._sessions.pop(key, None)
+        return True
+
+_uploader: Optional[ResumableUploader] = None
+_uploader_lock = threading.Lock()
+
+def get_uploader() -> ResumableUploader:
+    """Return the process-wide uploader, creating it on first use."""
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = ResumableUploader(SUPABASE_URL, SUPABASE_KEY)
+    return _uploader
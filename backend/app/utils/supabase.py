@@ -1,12 +1,6 @@
-from supabase import create_client, Client
-from flask import current_app
 import os
-
-def get_supabase_client() -> Client:
-    """Get a Supabase client instance."""
-    url = current_app.config['SUPABASE_URL']
-    key = current_app.config['SUPABASE_KEY']
-    return create_client(url, key)
+from app.config.supabase import get_supabase_client
+from app.utils.resumable_upload import get_uploader, file_sha256
 
 def create_folder(name: str):
     """Create a new folder."""
@@ -33,18 +27,19 @@ def delete_folder(folder_id: str):
     return response.data[0] if response.data else None
 
 def upload_file_to_storage(file_path: str, filename: str) -> str:
-    """Upload file to Supabase storage and return the URL."""
-    supabase = get_supabase_client()
-    with open(file_path, 'rb') as f:
-        file_data = f.read()
-    
-    storage_path = f"/{filename}"
-    response = supabase.storage.from_('files').upload(storage_path, file_data)
-    
-    if response.error:
-        raise Exception(f"Failed to upload file to storage: {response.error}")
-    
-    return storage_path
+    """Upload file to Supabase storage and return its path.
+
+    The file is streamed in resumable chunks and stored under its content
+    hash, so uploading identical content again is a no-op.
+    """
+    object_name = f"{file_sha256(file_path)}{os.path.splitext(filename)[1].lower()}"
+    try:
+        if not get_uploader().upload('files', object_name, file_path):
+            print(f"{filename} is already stored as {object_name}")
+    except Exception as e:
+        raise Exception(f"Failed to upload file to storage: {str(e)}")
+
+    return f"/{object_name}"
 
 def create_file(folder_id: str, filename: str, storage_path: str, size: int):
     """Create a new file record."""
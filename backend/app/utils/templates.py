@@ -0,0 +1,93 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Placeholders the GPT prompt is allowed to use in generated emails
+PLACEHOLDERS = ('first_name', 'last_name', 'email', 'title', 'location')
+
+_PLACEHOLDER_RE = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+
+class CompiledTemplate:
+    """A template parsed once into literal segments and placeholder slots.
+
+    ``parts`` alternates literals and slot names: even indexes are literal
+    text and odd indexes are placeholder names.
+    """
+
+    __slots__ = ('parts', 'slots', 'unknown_placeholders')
+
+    def __init__(self, parts: List[str], unknown_placeholders: Tuple[str, ...]):
+        self.parts = parts
+        self.slots = tuple(parts[1::2])
+        self.unknown_placeholders = unknown_placeholders
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Fill every slot from ``values`` with a single join.
+
+        Placeholders without a value are left in the text unchanged.
+        """
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            value = values.get(parts[i])
+            parts[i] = '{' + parts[i] + '}' if value is None else str(value)
+        return ''.join(parts)
+
+
+def compile_template(content: str, allowed: Optional[Iterable[str]] = PLACEHOLDERS) -> CompiledTemplate:
+    """Parse template content into a CompiledTemplate.
+
+    Placeholders outside ``allowed`` are reported in ``unknown_placeholders``
+    and kept as literal text, matching the previous ``str.replace`` behaviour.
+    """
+    allowed = set(allowed) if allowed is not None else None
+    parts = ['']
+    unknown = []
+    position = 0
+    for match in _PLACEHOLDER_RE.finditer(content):
+        name = match.group(1)
+        if allowed is not None and name not in allowed:
+            if name not in unknown:
+                unknown.append(name)
+            continue
+        parts[-1] += content[position:match.start()]
+        parts.extend([name, ''])
+        position = match.end()
+    parts[-1] += content[position:]
+    return CompiledTemplate(parts, tuple(unknown))
+
+
+class TemplateCache:
+    """LRU cache of compiled templates keyed by a hash of their content."""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._templates: 'OrderedDict[str, CompiledTemplate]' = OrderedDict()
+
+    def get(self, content: str) -> CompiledTemplate:
+        key = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        template = compile_template(content)
+        if template.unknown_placeholders:
+            print(f"Template uses unknown placeholders: {', '.join(template.unknown_placeholders)}")
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return template
+
+
+template_cache = TemplateCache()
+
+
+def render(content: str, values: Dict[str, Any]) -> str:
+    """Render template content with values, compiling it at most once."""
+    return template_cache.get(content).render(values)
@@ -22,6 +22,10 @@ create table if not exists sessions (
     updated_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
+-- Rolling summary of turns that no longer fit the chat context budget
+alter table sessions add column if not exists summary text;
+alter table sessions add column if not exists summary_until timestamp with time zone;
+
 -- Create sequences table
 create table if not exists sequences (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -30,24 +34,83 @@ create table if not exists sequences (
     content TEXT,
     steps JSONB,
     metadata JSONB,
+    segment JSONB,
     is_active BOOLEAN DEFAULT true,
     status TEXT DEFAULT 'DRAFT',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Audience filters applied when a sequence is published
+alter table sequences add column if not exists segment jsonb;
+
+-- One-time data migrations, recorded so re-running this file does not apply them again
+create table if not exists schema_migrations (
+    name text primary key,
+    applied_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+-- Sending is gated on is_active; sequences published before that was set on publish keep sending.
+-- Runs once only, so a sequence paused later is not resumed by re-applying the schema.
+with applied as (
+    insert into schema_migrations (name) values ('backfill_sequences_is_active')
+    on conflict (name) do nothing
+    returning name
+)
+update sequences set is_active = true
+where status = 'ACTIVE' and exists (select 1 from applied);
+
+-- Computed column so list views can select step_count instead of the full steps
+create or replace function step_count(sequences) returns integer as $$
+    select coalesce(jsonb_array_length($1.steps), 0);
+$$ language sql stable;
+
 -- Create email_queue table
 create table if not exists email_queue (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
     sequence_id UUID NOT NULL REFERENCES sequences(id) ON DELETE CASCADE,
     step_number INTEGER NOT NULL,
     to_email TEXT NOT NULL,
-    subject TEXT NOT NULL,
-    content TEXT NOT NULL,
+    subject TEXT,
+    content TEXT,
+    template_version TEXT,
     scheduled_time TIMESTAMP WITH TIME ZONE NOT NULL,
     status TEXT NOT NULL DEFAULT 'PENDING',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    template_vars JSONB DEFAULT '{}'::jsonb
+    template_vars JSONB DEFAULT '{}'::jsonb,
+    locked_by TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    schedule_next BOOLEAN DEFAULT false
+);
+
+-- Versioned step templates referenced by deferred email_queue rows
+create table if not exists sequence_step_templates (
+    sequence_id UUID NOT NULL REFERENCES sequences(id) ON DELETE CASCADE,
+    step_number INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sequence_id, step_number, version)
+);
+
+-- Deferred rows carry template_version and template_vars instead of a rendered body
+alter table email_queue add column if not exists template_version text;
+alter table email_queue alter column subject drop not null;
+alter table email_queue alter column content drop not null;
+
+-- Lease columns used by workers to claim queue rows (IN_FLIGHT status)
+alter table email_queue add column if not exists locked_by text;
+alter table email_queue add column if not exists lease_expires_at timestamp with time zone;
+
+-- Lazy scheduling: sending a row with schedule_next set queues the sequence's following step
+alter table email_queue add column if not exists schedule_next boolean default false;
+
+-- Addresses that must never be mailed again (unsubscribes, hard bounces)
+create table if not exists email_suppressions (
+    email TEXT PRIMARY KEY,
+    reason TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create smtp_settings table
@@ -72,3 +135,8 @@ create index if not exists idx_email_queue_sequence_id on email_queue(sequence_i
 create index if not exists idx_email_queue_status on email_queue(status);
 create index if not exists idx_email_queue_scheduled_time on email_queue(scheduled_time);
 create index if not exists idx_email_queue_status_scheduled on email_queue(status, scheduled_time);
+create index if not exists idx_email_queue_status_scheduled_id on email_queue(status, scheduled_time, id);
+create index if not exists idx_email_queue_status_lease on email_queue(status, lease_expires_at);
+create index if not exists idx_email_suppressions_created_at on email_suppressions(created_at);
+create index if not exists idx_sequences_updated_at on sequences(updated_at);
+create index if not exists idx_sequences_created_at_id on sequences(created_at desc, id desc);
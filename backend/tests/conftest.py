@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The app reads its configuration at import time; point it at placeholders
+# so the pure helpers can be tested without Supabase, SMTP or OpenAI.
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+os.environ.setdefault('SUPABASE_KEY', 'test.test.test')
+os.environ.setdefault('SMTP_PORT', '25')
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
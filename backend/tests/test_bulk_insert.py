@@ -0,0 +1,86 @@
+import pytest
+from app.services import bulk_insert
+from app.services.bulk_insert import insert_in_chunks, queue_row_id
+
+
+class FakeTable:
+    """Records upserted chunks; fails the calls listed in ``failures``."""
+
+    def __init__(self, failures=()):
+        self.chunks = []
+        self.calls = 0
+        self.failures = set(failures)
+        self._pending = None
+
+    def table(self, name):
+        assert name == 'email_queue'
+        return self
+
+    def upsert(self, rows, ignore_duplicates=False):
+        assert ignore_duplicates
+        self._pending = rows
+        return self
+
+    def execute(self):
+        self.calls += 1
+        if self.calls in self.failures:
+            raise RuntimeError('connection reset')
+        self.chunks.append(self._pending)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(bulk_insert.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def _rows(count):
+    return ({'id': str(i)} for i in range(count))
+
+
+def test_rows_are_inserted_in_chunks(monkeypatch, sleeps):
+    fake = FakeTable()
+    monkeypatch.setattr(bulk_insert, 'supabase', fake)
+    progress = []
+    assert insert_in_chunks('email_queue', _rows(7), chunk_size=3, on_progress=progress.append) == 7
+    assert [len(chunk) for chunk in fake.chunks] == [3, 3, 1]
+    assert progress == [3, 6, 7]
+    assert sleeps == []
+
+
+def test_rows_are_pulled_one_chunk_at_a_time(monkeypatch, sleeps):
+    fake = FakeTable()
+    monkeypatch.setattr(bulk_insert, 'supabase', fake)
+    pulled = []
+
+    def rows():
+        for i in range(6):
+            # Everything before the current chunk must already be written
+            assert len(pulled) - sum(len(chunk) for chunk in fake.chunks) < 2
+            pulled.append(i)
+            yield {'id': str(i)}
+
+    insert_in_chunks('email_queue', rows(), chunk_size=2)
+    assert len(fake.chunks) == 3
+
+
+def test_failed_chunk_is_retried_with_backoff(monkeypatch, sleeps):
+    fake = FakeTable(failures={2, 3})
+    monkeypatch.setattr(bulk_insert, 'supabase', fake)
+    assert insert_in_chunks('email_queue', _rows(4), chunk_size=2) == 4
+    assert [[row['id'] for row in chunk] for chunk in fake.chunks] == [['0', '1'], ['2', '3']]
+    assert sleeps == [0.5, 1.0]
+
+
+def test_gives_up_after_max_retries(monkeypatch, sleeps):
+    fake = FakeTable(failures={2, 3, 4})
+    monkeypatch.setattr(bulk_insert, 'supabase', fake)
+    with pytest.raises(Exception, match='after 2 rows'):
+        insert_in_chunks('email_queue', _rows(4), chunk_size=2, max_retries=2)
+    assert len(fake.chunks) == 1
+
+
+def test_queue_row_id_is_deterministic():
+    assert queue_row_id('seq', 1, 'Ada@Example.com') == queue_row_id('seq', 1, 'ada@example.com')
+    assert queue_row_id('seq', 1, 'ada@example.com') != queue_row_id('seq', 2, 'ada@example.com')
@@ -0,0 +1,99 @@
+import pytest
+from app.services import context_builder as context_builder_module
+from app.services.context_builder import ContextBuilder, count_tokens, truncate_tokens
+
+
+class FakeMessages:
+    """In-memory stand-in for MessageService."""
+
+    def __init__(self):
+        self.messages = []
+        self.summary = {'summary': None, 'summary_until': None}
+        self.summary_writes = 0
+
+    def add(self, content, role='user'):
+        self.messages.append({
+            'role': role,
+            'content': content,
+            'created_at': f"2024-01-01T00:{len(self.messages) // 60:02d}:{len(self.messages) % 60:02d}"
+        })
+
+    def get_messages(self, session_id, limit=10, offset=0):
+        return list(reversed(self.messages))[offset:offset + limit]
+
+    def get_messages_before(self, session_id, before, after=None, limit=50):
+        older = [m for m in self.messages if m['created_at'] < before and (not after or m['created_at'] > after)]
+        return older[-limit:]
+
+    def get_session_summary(self, session_id):
+        return dict(self.summary)
+
+    def update_session_summary(self, session_id, summary, summary_until):
+        self.summary = {'summary': summary, 'summary_until': summary_until}
+        self.summary_writes += 1
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    fake = FakeMessages()
+    monkeypatch.setattr(context_builder_module, 'message_service', fake)
+    return fake
+
+
+SYSTEM = [{'role': 'system', 'content': 'You write email sequences.'}]
+
+
+def _summary(prompt):
+    return next((m['content'] for m in prompt if m['content'].startswith('Summary of earlier')), '')
+
+
+def test_short_history_is_sent_whole(messages):
+    messages.add('hello')
+    messages.add('hi there', role='assistant')
+    prompt = ContextBuilder().build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    assert [m['content'] for m in prompt] == ['You write email sequences.', 'hello', 'hi there', 'next']
+    assert messages.summary_writes == 0
+
+
+def test_messages_over_budget_are_summarized(messages):
+    for i in range(6):
+        messages.add(f"turn {i} " + 'word ' * 40)
+    builder = ContextBuilder(budget_tokens=300, summary_tokens=100, summary_line_tokens=5)
+    prompt = builder.build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    history = [m['content'] for m in prompt if m['content'].startswith('turn')]
+    summary = _summary(prompt)
+    assert history and history[-1].startswith('turn 5')
+    assert 'turn 0' in summary and 'turn 5' not in summary
+    assert messages.summary['summary_until'] == messages.messages[5 - len(history)]['created_at']
+
+
+def test_messages_that_age_out_of_the_window_are_summarized(messages):
+    builder = ContextBuilder(history_limit=50)
+    for turn in range(30):
+        messages.add(f"question {turn}")
+        messages.add(f"answer {turn}", role='assistant')
+        builder.build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    prompt = builder.build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    summary = _summary(prompt)
+    # 60 messages with a window of 50: the first five turns only live in the summary
+    for turn in range(5):
+        assert f"question {turn}" in summary and f"answer {turn}" in summary
+    assert 'question 5' not in summary
+    assert sum(m['content'].startswith(('question', 'answer')) for m in prompt) == 50
+
+
+def test_summary_is_not_folded_twice(messages):
+    builder = ContextBuilder(history_limit=4)
+    for i in range(6):
+        messages.add(f"m{i}")
+    builder.build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    builder.build('s', SYSTEM, {'role': 'user', 'content': 'next'})
+    assert messages.summary['summary'].split('\n') == ['user: m0', 'user: m1']
+    assert messages.summary_writes == 1
+
+
+def test_truncate_tokens():
+    text = 'word ' * 100
+    assert truncate_tokens('short', 10) == 'short'
+    truncated = truncate_tokens(text, 10)
+    assert truncated.endswith('…') and count_tokens(truncated) <= 12
@@ -0,0 +1,71 @@
+import pytest
+from app.services import conversation_cache as conversation_cache_module
+from app.services.conversation_cache import ConversationCache
+
+
+class Loader:
+    """Returns the newest ``limit`` of ``count`` messages, newest first, counting calls."""
+
+    def __init__(self, count):
+        self.messages = [{'id': i, 'content': f"message {i}"} for i in reversed(range(count))]
+        self.calls = []
+
+    def __call__(self, limit):
+        self.calls.append(limit)
+        return self.messages[:limit]
+
+
+def test_miss_loads_the_window_then_serves_from_cache():
+    cache = ConversationCache(window=5)
+    loader = Loader(20)
+    assert [m['id'] for m in cache.get_messages('s', 3, 0, loader)] == [19, 18, 17]
+    assert [m['id'] for m in cache.get_messages('s', 2, 3, loader)] == [16, 15]
+    assert loader.calls == [5]
+
+
+def test_pages_beyond_the_window_go_to_the_loader():
+    cache = ConversationCache(window=5)
+    loader = Loader(20)
+    assert [m['id'] for m in cache.get_messages('s', 3, 4, loader)] == [15, 14, 13]
+    assert loader.calls == [7]
+
+
+def test_short_session_is_complete():
+    cache = ConversationCache(window=5)
+    loader = Loader(2)
+    assert len(cache.get_messages('s', 5, 0, loader)) == 2
+    assert len(cache.get_messages('s', 5, 0, loader)) == 2
+    assert loader.calls == [5]
+
+
+def test_appended_messages_are_served_without_reloading():
+    cache = ConversationCache(window=3)
+    loader = Loader(0)
+    assert cache.get_messages('s', 3, 0, loader) == []
+    for i in range(4):
+        cache.append('s', {'id': 100 + i})
+    assert [m['id'] for m in cache.get_messages('s', 3, 0, loader)] == [103, 102, 101]
+    assert loader.calls == [3]
+
+
+def test_append_ignores_sessions_that_are_not_cached():
+    cache = ConversationCache(window=3)
+    cache.append('s', {'id': 1})
+    loader = Loader(2)
+    assert [m['id'] for m in cache.get_messages('s', 3, 0, loader)] == [1, 0]
+
+
+class DownRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError('redis is down')
+        return fail
+
+
+def test_unreachable_shared_backend_falls_back_to_the_loader(monkeypatch):
+    monkeypatch.setattr(conversation_cache_module, 'get_shared_backend', lambda: DownRedis())
+    cache = ConversationCache(window=5)
+    loader = Loader(3)
+    assert [m['id'] for m in cache.get_messages('s', 2, 0, loader)] == [2, 1]
+    cache.append('s', {'id': 3})
+    assert loader.calls == [2]
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+import pytest
+from app.services import document_index
+from app.services.document_index import DocumentIndexService, FolderIndex, chunk_text, extract_text
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_chunk_text_overlaps_windows():
+    words = [f"w{i}" for i in range(10)]
+    chunks = chunk_text(' '.join(words), chunk_words=4, overlap_words=1)
+    assert chunks == ['w0 w1 w2 w3', 'w3 w4 w5 w6', 'w6 w7 w8 w9']
+
+
+def test_chunk_text_short_and_empty():
+    assert chunk_text('one two', chunk_words=4, overlap_words=1) == ['one two']
+    assert chunk_text('') == []
+
+
+def test_extract_text_rejects_unknown_types():
+    assert extract_text('notes.md', b'# Notes') == '# Notes'
+    with pytest.raises(ValueError):
+        extract_text('image.png', b'')
+
+
+def test_search_returns_best_matches_first():
+    index = FolderIndex()
+    index.add_file('a', 'v1', ['north', 'east'], _normalized([[1, 0], [0, 1]]))
+    index.add_file('b', 'v1', ['north-east'], _normalized([[1, 1]]))
+    results = index.search(_normalized([[1, 0.1]])[0], k=2)
+    assert [result['text'] for result in results] == ['north', 'north-east']
+    assert results[0]['file_id'] == 'a'
+
+
+def test_add_file_replaces_previous_version():
+    index = FolderIndex()
+    index.add_file('a', 'v1', ['old one', 'old two'], _normalized([[1, 0], [0, 1]]))
+    index.add_file('a', 'v2', ['new'], _normalized([[1, 1]]))
+    assert index.texts == ['new']
+    assert index.versions == {'a': 'v2'}
+    index.remove_file('a')
+    assert len(index) == 0 and index.versions == {}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'folder.npz')
+    index = FolderIndex()
+    index.add_file('a', 'v1', ['alpha', 'beta'], _normalized([[1, 0], [0, 1]]))
+    index.save(path)
+    loaded = FolderIndex.load(path)
+    assert loaded.texts == ['alpha', 'beta']
+    assert loaded.file_ids == ['a', 'a']
+    assert loaded.versions == {'a': 'v1'}
+    assert np.allclose(loaded.embeddings, index.embeddings)
+
+
+def test_ivf_search_finds_nearest_neighbour():
+    rng = np.random.default_rng(1)
+    embeddings = _normalized(rng.normal(size=(400, 8)))
+    index = FolderIndex(ivf_min_size=100, nprobe=4)
+    index.add_file('a', 'v1', [str(i) for i in range(400)], embeddings)
+    index.build()
+    assert len(index.centroids) == 20
+    assert len(index.assignments) == 400
+    results = index.search(embeddings[123], k=1)
+    assert results[0]['text'] == '123'
+    assert results[0]['score'] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_small_index_is_not_partitioned():
+    index = FolderIndex(ivf_min_size=100)
+    index.add_file('a', 'v1', ['x'], _normalized([[1, 0]]))
+    index.build()
+    assert len(index.centroids) == 0
+
+
+def test_save_leaves_no_temporary_files(tmp_path):
+    index = FolderIndex()
+    index.add_file('a', 'v1', ['alpha'], _normalized([[1, 0]]))
+    index.save(str(tmp_path / 'folder.npz'))
+    index.save(str(tmp_path / 'folder.npz'))
+    assert os.listdir(tmp_path) == ['folder.npz']
+
+
+FILES = [{'id': 'f1', 'filename': 'notes.txt', 'storage_path': '/abc.txt', 'size': 10, 'status': 'processing'}]
+
+
+def _vectorize_slowly(log_path):
+    def vectorize(self, file):
+        with open(log_path, 'a') as log:
+            log.write(f"{file['id']}\n")
+        time.sleep(0.5)
+        return ['alpha'], _normalized([[1, 0]])
+    return vectorize
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    statuses = []
+    monkeypatch.setattr(document_index, 'get_folder_files', lambda folder_id: FILES)
+    monkeypatch.setattr(document_index, 'update_file_status', lambda file_id, status: statuses.append(status))
+    monkeypatch.setattr(DocumentIndexService, '_vectorize', _vectorize_slowly(str(tmp_path / 'vectorized.log')))
+    return DocumentIndexService(index_dir=str(tmp_path / 'index'))
+
+
+def test_sync_folder_only_embeds_changed_files(service, tmp_path):
+    assert service.sync_folder('folder')['indexed'] == 1
+    assert service.sync_folder('folder') == {'indexed': 0, 'unchanged': 1, 'removed': 0, 'failed': 0}
+    assert (tmp_path / 'vectorized.log').read_text() == 'f1\n'
+
+
+@pytest.mark.skipif(document_index.fcntl is None, reason='needs fcntl')
+def test_sync_folder_is_serialized_across_processes(service, tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=service.sync_folder, args=('folder',)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=10)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    # The second worker waited for the first and found the file already indexed
+    assert (tmp_path / 'vectorized.log').read_text() == 'f1\n'
+    assert FolderIndex.load(service._path('folder')).versions == {'f1': '/abc.txt:10'}
@@ -0,0 +1,147 @@
+import threading
+import time
+import pytest
+from app.services import email_dispatcher
+from app.services.email_dispatcher import DomainRateLimiter, EmailDispatcher, SKIPPED
+
+
+def _emails(count, domain='example.com'):
+    return [{'id': str(i), 'to_email': f"user{i}@{domain}"} for i in range(count)]
+
+
+class StatusLog:
+    def __init__(self):
+        self.writes = []
+        self._lock = threading.Lock()
+
+    def __call__(self, status, ids):
+        with self._lock:
+            self.writes.append((status, sorted(ids, key=int)))
+
+    def ids(self, status):
+        return sorted((i for written, ids in self.writes if written == status for i in ids), key=int)
+
+
+def test_statuses_are_written_in_batches():
+    log = StatusLog()
+    dispatcher = EmailDispatcher(
+        send_fn=lambda email: int(email['id']) % 5 != 0,
+        status_writer=log,
+        concurrency=4,
+        status_batch_size=10
+    )
+    counts = dispatcher.dispatch(_emails(50))
+    assert counts == {'SENT': 40, 'FAILED': 10}
+    assert log.ids('FAILED') == [str(i) for i in range(0, 50, 5)]
+    assert len(log.ids('SENT')) == 40
+    assert all(len(ids) <= 10 for _, ids in log.writes)
+    # 40 sent in batches of 10 and the 10 failures in one
+    assert len(log.writes) == 5
+
+
+def test_send_errors_count_as_failed():
+    def send(email):
+        raise RuntimeError('smtp down')
+
+    log = StatusLog()
+    assert EmailDispatcher(send, log).dispatch(_emails(3)) == {'FAILED': 3}
+    assert log.ids('FAILED') == ['0', '1', '2']
+
+
+def test_screened_emails_are_not_sent():
+    sent = []
+    log = StatusLog()
+    dispatcher = EmailDispatcher(
+        send_fn=lambda email: sent.append(email['id']) or True,
+        status_writer=log,
+        screen_fn=lambda email: 'SUPPRESSED' if email['id'] == '1' else None
+    )
+    assert dispatcher.dispatch(_emails(3)) == {'SENT': 2, 'SUPPRESSED': 1}
+    assert sorted(sent) == ['0', '2']
+    assert log.ids('SUPPRESSED') == ['1']
+
+
+def test_lost_leases_are_skipped_and_not_acknowledged():
+    sent = []
+    log = StatusLog()
+    dispatcher = EmailDispatcher(
+        send_fn=lambda email: sent.append(email['id']) or True,
+        status_writer=log,
+        lease_fn=lambda email: email['id'] != '2'
+    )
+    assert dispatcher.dispatch(_emails(3)) == {'SENT': 2, SKIPPED: 1}
+    assert sorted(sent) == ['0', '1']
+    assert [status for status, _ in log.writes] == ['SENT']
+
+
+def test_pending_statuses_are_flushed_when_the_source_fails():
+    def source():
+        yield from _emails(2)
+        raise RuntimeError('query failed')
+
+    log = StatusLog()
+    with pytest.raises(RuntimeError):
+        EmailDispatcher(lambda email: True, log).dispatch(source())
+    assert log.ids('SENT') == ['0', '1']
+
+
+def test_concurrency_is_bounded():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def send(email):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return True
+
+    EmailDispatcher(send, StatusLog(), concurrency=3).dispatch(_emails(30))
+    assert 1 < peak[0] <= 3
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(email_dispatcher, 'time', clock)
+    return clock
+
+
+def test_domain_rate_limiter_allows_a_burst_then_waits(clock):
+    limiter = DomainRateLimiter(per_minute=60)
+    for _ in range(60):
+        limiter.acquire('example.com')
+    assert clock.sleeps == []
+    limiter.acquire('example.com')
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_domain_rate_limiter_is_per_domain(clock):
+    limiter = DomainRateLimiter(per_minute=1)
+    limiter.acquire('a.com')
+    limiter.acquire('b.com')
+    assert clock.sleeps == []
+    limiter.acquire('a.com')
+    assert clock.sleeps == [pytest.approx(60.0)]
+
+
+def test_domain_rate_limiter_disabled(clock):
+    limiter = DomainRateLimiter(per_minute=0)
+    for _ in range(1000):
+        limiter.acquire('example.com')
+    assert clock.sleeps == []
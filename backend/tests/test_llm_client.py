@@ -0,0 +1,158 @@
+import asyncio
+import gc
+import json
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+import pytest
+from app.services.llm_client import LLMClient
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """Local OpenAI-compatible server answering /chat/completions from a script.
+
+    Each scripted entry is a status code, optionally with a delay in seconds;
+    once the script is used up every request succeeds.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.script = []
+        self.models = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def next_reply(self, model):
+        with self.lock:
+            self.models.append(model)
+            return self.script.pop(0) if self.script else 200
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        reply = self.server.next_reply(body['model'])
+        status, delay = reply if isinstance(reply, tuple) else (reply, 0)
+        time.sleep(delay)
+        if status == 200:
+            payload = {
+                'id': 'chatcmpl-test',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body['model'],
+                'choices': [{
+                    'index': 0,
+                    'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': f"answer from {body['model']}"}
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+            }
+        else:
+            payload = {'error': {'message': f"status {status}", 'type': 'test_error'}}
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs):
+    options = {'models': ['fast', 'strong'], 'max_retries': 1, 'backoff_base': 0.01, 'timeout': 5.0}
+    options.update(kwargs)
+    return LLMClient(api_key='test', base_url=server.base_url, **options)
+
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+def _content(response):
+    return response.choices[0].message.content
+
+
+def test_success_uses_fast_model(server):
+    assert _content(_client(server).create(messages=MESSAGES)) == 'answer from fast'
+    assert server.models == ['fast']
+
+
+def test_retries_server_errors_within_tier(server):
+    server.script = [500]
+    assert _content(_client(server).create(messages=MESSAGES)) == 'answer from fast'
+    assert server.models == ['fast', 'fast']
+
+
+def test_escalates_when_tier_is_exhausted(server):
+    server.script = [500, 429]
+    assert _content(_client(server).create(messages=MESSAGES)) == 'answer from strong'
+    assert server.models == ['fast', 'fast', 'strong']
+
+
+def test_raises_last_error_when_every_tier_fails(server):
+    server.script = [503] * 4
+    with pytest.raises(openai.InternalServerError):
+        _client(server).create(messages=MESSAGES)
+    assert server.models == ['fast', 'fast', 'strong', 'strong']
+
+
+def test_client_errors_are_not_retried(server):
+    server.script = [400]
+    with pytest.raises(openai.BadRequestError):
+        _client(server).create(messages=MESSAGES)
+    assert server.models == ['fast']
+
+
+def test_timeout_is_retried(server):
+    server.script = [(200, 1.0)]
+    client = _client(server, timeout=0.2)
+    assert _content(client.create(messages=MESSAGES)) == 'answer from fast'
+    assert server.models == ['fast', 'fast']
+
+
+def test_hedged_request_returns_first_answer(server):
+    server.script = [(200, 1.0)]
+    client = _client(server, hedge=True, hedge_min_delay=0.1, timeout=0.4)
+    started = time.monotonic()
+    assert _content(client.create(messages=MESSAGES)) == 'answer from fast'
+    assert time.monotonic() - started < 1.0
+    assert server.models == ['fast', 'fast']
+
+
+def test_async_calls_work_across_event_loops(server):
+    server.script = [500]
+    client = _client(server)
+    # Each asyncio.run is a new loop, as with Flask's async views
+    for _ in range(3):
+        assert _content(asyncio.run(client.acreate(messages=MESSAGES))) == 'answer from fast'
+    assert server.models == ['fast'] * 4
+
+
+def test_async_calls_close_their_connections(server):
+    server.script = [(200, 1.0), 200, (200, 1.0), 200]
+    client = _client(server, hedge=True, hedge_min_delay=0.1, timeout=0.4)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        for _ in range(2):
+            # The slow primary is cancelled once the hedge answers
+            started = time.monotonic()
+            assert _content(asyncio.run(client.acreate(messages=MESSAGES))) == 'answer from fast'
+            assert time.monotonic() - started < 1.0
+        gc.collect()
+    assert not [warning for warning in caught if issubclass(warning.category, ResourceWarning)]
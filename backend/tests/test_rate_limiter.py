@@ -0,0 +1,60 @@
+import pytest
+from app.utils import rate_limiter
+from app.utils.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def test_requests_wait_for_the_oldest_to_leave_the_window(clock):
+    limiter = RateLimiter(requests_per_minute=3)
+    for second in range(3):
+        clock.now = second * 10
+        limiter.acquire()
+    assert clock.sleeps == []
+    limiter.acquire()
+    # The first request was made at t=0 and the window is 60s
+    assert clock.sleeps == [pytest.approx(40)]
+
+
+def test_tokens_are_limited_per_minute(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.acquire(600)
+    clock.now = 30
+    limiter.acquire(300)
+    assert clock.sleeps == []
+    limiter.acquire(200)
+    assert clock.sleeps == [pytest.approx(30)]
+    # The 600 token request expired, leaving 300 + 200 in the window
+    assert limiter._tokens == 500
+
+
+def test_oversized_request_runs_once_the_window_is_empty(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.acquire(100)
+    limiter.acquire(5000)
+    assert clock.sleeps == [pytest.approx(60)]
+
+
+def test_zero_limits_never_wait(clock):
+    limiter = RateLimiter()
+    for _ in range(1000):
+        limiter.acquire(10000)
+    assert clock.sleeps == []
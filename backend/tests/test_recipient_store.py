@@ -0,0 +1,86 @@
+import json
+import os
+import pytest
+from app.services.recipient_store import RecipientStore, validate_segment
+
+USERS = [
+    {'email': 'ada@example.com', 'first_name': 'Ada', 'title': 'CTO', 'location': 'London'},
+    {'email': 'grace@example.com', 'first_name': 'Grace', 'title': 'VP Engineering', 'location': 'New York'},
+    {'email': 'linus@example.com', 'first_name': 'Linus', 'title': 'cto', 'location': 'Portland'},
+    {'email': 'ken@example.com', 'first_name': 'Ken'},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps(USERS))
+    return RecipientStore(str(path))
+
+
+def _emails(users):
+    return [user['email'] for user in users]
+
+
+def test_iter_users_streams_every_recipient(store):
+    users = list(store.iter_users())
+    assert _emails(users) == _emails(USERS)
+    assert len(store) == 4
+
+
+def test_missing_fields_are_left_out(store):
+    ken = list(store.iter_users())[3]
+    assert ken == {'email': 'ken@example.com', 'first_name': 'Ken'}
+
+
+def test_get_by_email_is_case_insensitive(store):
+    assert store.get_by_email('GRACE@example.com') == USERS[1]
+    assert store.get_by_email('ken@example.com') == {'email': 'ken@example.com', 'first_name': 'Ken'}
+    assert store.get_by_email('nobody@example.com') is None
+
+
+def test_reloads_when_file_changes(store):
+    assert len(store) == 4
+    with open(store.path, 'w') as f:
+        json.dump(USERS[:1], f)
+    stat = os.stat(store.path)
+    os.utime(store.path, (stat.st_atime, stat.st_mtime + 10))
+    assert _emails(store.iter_users()) == ['ada@example.com']
+    assert store.get_by_email('grace@example.com') is None
+
+
+def test_validate_segment_accepts_empty():
+    assert validate_segment(None) == []
+    assert validate_segment({}) == []
+
+
+@pytest.mark.parametrize('segment', [
+    {'filters': 'title=cto'},
+    {'filters': [{'op': 'eq', 'value': 'x'}]},
+    {'filters': [{'field': 'title', 'op': 'like', 'value': 'x'}]},
+    {'filters': [{'field': 'title', 'op': 'in', 'value': 'cto'}]},
+])
+def test_validate_segment_rejects_bad_filters(segment):
+    with pytest.raises(ValueError):
+        validate_segment(segment)
+
+
+@pytest.mark.parametrize('segment_filter, expected', [
+    ({'field': 'title', 'op': 'eq', 'value': 'CTO'}, ['ada@example.com', 'linus@example.com']),
+    ({'field': 'title', 'op': 'neq', 'value': 'cto'}, ['grace@example.com', 'ken@example.com']),
+    ({'field': 'location', 'op': 'in', 'value': ['london', 'Portland']}, ['ada@example.com', 'linus@example.com']),
+    ({'field': 'location', 'op': 'not_in', 'value': ['London']}, ['grace@example.com', 'linus@example.com', 'ken@example.com']),
+    ({'field': 'title', 'op': 'contains', 'value': 'engineer'}, ['grace@example.com']),
+    ({'field': 'email', 'op': 'startswith', 'value': 'LI'}, ['linus@example.com']),
+])
+def test_filters(store, segment_filter, expected):
+    assert _emails(store.iter_users([segment_filter])) == expected
+    assert store.count([segment_filter]) == len(expected)
+
+
+def test_filters_are_combined(store):
+    filters = validate_segment({'filters': [
+        {'field': 'title', 'op': 'eq', 'value': 'cto'},
+        {'field': 'location', 'op': 'neq', 'value': 'london'}
+    ]})
+    assert _emails(store.iter_users(filters)) == ['linus@example.com']
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+from app.services.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(ttl=10)
+    cache.set('a', 1)
+    clock.now = 9
+    assert cache.get('a') == 1
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 0}
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+
+def test_ttl_cache_peek_changes_nothing(clock):
+    cache = TTLCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.peek('a') == 1
+    assert cache.peek('missing', 'default') == 'default'
+    cache.set('c', 3)
+    # peek did not refresh 'a', so it was the one evicted
+    assert 'a' not in cache
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 0
+
+
+VOCABULARY = ['create', 'sequence', 'onboarding', 'saas', 'trial', 'users', 'set', 'delay', 'step', '3', '5', 'days']
+
+
+def _embed(text):
+    words = text.lower().replace(',', ' ').split()
+    vector = np.array([float(word in words) for word in VOCABULARY]) + 1e-3
+    return vector / np.linalg.norm(vector)
+
+
+def _messages(last):
+    return [{'role': 'system', 'content': 'You write sequences.'}, {'role': 'user', 'content': last}]
+
+
+def _semantic_cache(threshold=0.9):
+    cache = ResponseCache(semantic=True, semantic_threshold=threshold)
+    cache._embed = _embed
+    return cache
+
+
+REPLY = {'content': 'Sure', 'function_call': None}
+
+
+def test_exact_hit_ignores_whitespace():
+    cache = ResponseCache()
+    cache.set(_messages('Create a  sequence'), 'gpt', 0.1, 'fn', REPLY)
+    assert cache.get(_messages(' Create a sequence\n'), 'gpt', 0.1, 'fn') == REPLY
+    assert cache.get(_messages('Create a sequence'), 'gpt', 0.7, 'fn') is None
+    assert cache.get(_messages('Create a sequence'), 'gpt', 0.1, 'other-functions') is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'semantic_hits': 0, 'size': 1}
+
+
+def test_semantic_hit_is_counted_once():
+    cache = _semantic_cache()
+    cache.set(_messages('create onboarding sequence for saas trial users'), 'gpt', 0.1, 'fn', REPLY)
+    assert cache.get(_messages('create an onboarding sequence for saas trial users'), 'gpt', 0.1, 'fn') == REPLY
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'semantic_hits': 1, 'size': 1}
+
+
+def test_semantic_tier_needs_the_same_prefix():
+    cache = _semantic_cache()
+    cache.set(_messages('create onboarding sequence'), 'gpt', 0.1, 'fn', REPLY)
+    messages = [{'role': 'system', 'content': 'Another prompt.'}, {'role': 'user', 'content': 'create onboarding sequence'}]
+    assert cache.get(messages, 'gpt', 0.1, 'fn') is None
+
+
+def test_generation_calls_are_reused_but_edits_are_not():
+    cache = _semantic_cache(threshold=0.8)
+    generated = {'content': None, 'function_call': {'name': 'create_sequence', 'arguments': '{}'}}
+    patched = {'content': None, 'function_call': {'name': 'patch_sequence', 'arguments': '{"delay_days": 3}'}}
+    cache.set(_messages('create onboarding sequence for saas users'), 'gpt', 0.1, 'fn', generated)
+    cache.set(_messages('set step 2 delay 3 days'), 'gpt', 0.1, 'fn', patched)
+    assert cache.get(_messages('create onboarding sequence for saas trial users'), 'gpt', 0.1, 'fn') == generated
+    assert cache.get(_messages('set step 2 delay 5 days'), 'gpt', 0.1, 'fn') is None
+    # The exact request is still served
+    assert cache.get(_messages('set step 2 delay 3 days'), 'gpt', 0.1, 'fn') == patched
@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import httpx
+import pytest
+from app.utils import resumable_upload
+from app.utils.resumable_upload import ResumableUploader, file_sha256
+
+
+class FakeTus:
+    """In-memory TUS server; ``failures`` maps a PATCH number to how many bytes it stores before failing."""
+
+    def __init__(self, failures=None, existing=()):
+        self.uploads = {}
+        self.failures = dict(failures or {})
+        self.existing = set(existing)
+        self.patches = 0
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append((request.method, request.url.path))
+        if request.method == 'POST':
+            metadata = {
+                key: base64.b64decode(value).decode('utf-8')
+                for key, value in (item.split(' ') for item in request.headers['Upload-Metadata'].split(','))
+            }
+            if metadata['objectName'] in self.existing:
+                return httpx.Response(409)
+            url = f"/upload/{len(self.uploads)}"
+            self.uploads[url] = bytearray()
+            return httpx.Response(201, headers={'Location': f"http://storage.test{url}"})
+
+        data = self.uploads.get(request.url.path)
+        if data is None:
+            return httpx.Response(404)
+        if request.method == 'HEAD':
+            return httpx.Response(200, headers={'Upload-Offset': str(len(data))})
+
+        self.patches += 1
+        if int(request.headers['Upload-Offset']) != len(data):
+            return httpx.Response(409)
+        body = request.read()
+        if self.patches in self.failures:
+            data.extend(body[:self.failures[self.patches]])
+            return httpx.Response(503)
+        data.extend(body)
+        return httpx.Response(204, headers={'Upload-Offset': str(len(data))})
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(resumable_upload, 'CHUNK_SIZE', 10)
+    monkeypatch.setattr(resumable_upload.time, 'sleep', lambda seconds: None)
+
+
+@pytest.fixture
+def file_path(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(bytes(range(35)))
+    return str(path)
+
+
+def _uploader(server, max_retries=3):
+    uploader = ResumableUploader('http://storage.test', 'key', max_retries=max_retries)
+    uploader._client = httpx.Client(transport=httpx.MockTransport(server), headers=uploader._headers)
+    return uploader
+
+
+def test_uploads_in_chunks(file_path):
+    server = FakeTus()
+    assert _uploader(server).upload('docs', 'notes.txt', file_path) is True
+    assert bytes(server.uploads['/upload/0']) == bytes(range(35))
+    assert server.patches == 4
+
+
+def test_failed_chunk_resumes_from_the_server_offset(file_path):
+    # The second chunk is half stored before the request fails
+    server = FakeTus(failures={2: 5})
+    assert _uploader(server).upload('docs', 'notes.txt', file_path) is True
+    assert bytes(server.uploads['/upload/0']) == bytes(range(35))
+    assert ('HEAD', '/upload/0') in server.requests
+    assert [method for method, _ in server.requests].count('POST') == 1
+
+
+def test_failed_upload_is_resumed_by_the_next_call(file_path):
+    server = FakeTus(failures={2: 0, 3: 0})
+    uploader = _uploader(server, max_retries=1)
+    with pytest.raises(Exception, match='at offset 10'):
+        uploader.upload('docs', 'notes.txt', file_path)
+
+    assert uploader.upload('docs', 'notes.txt', file_path) is True
+    # The same upload URL was continued rather than started again
+    assert list(server.uploads) == ['/upload/0']
+    assert bytes(server.uploads['/upload/0']) == bytes(range(35))
+    assert uploader._sessions == {}
+
+
+def test_expired_session_starts_a_new_upload(file_path):
+    server = FakeTus()
+    uploader = _uploader(server)
+    uploader._sessions[('docs', 'notes.txt')] = 'http://storage.test/upload/expired'
+    assert uploader.upload('docs', 'notes.txt', file_path) is True
+    assert bytes(server.uploads['/upload/0']) == bytes(range(35))
+
+
+def test_existing_object_is_not_uploaded_again(file_path):
+    server = FakeTus(existing={'notes.txt'})
+    assert _uploader(server).upload('docs', 'notes.txt', file_path) is False
+    assert server.patches == 0
+
+
+def test_file_sha256_streams_the_file(file_path):
+    assert file_sha256(file_path, chunk_size=4) == hashlib.sha256(bytes(range(35))).hexdigest()
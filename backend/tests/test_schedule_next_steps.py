@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+import pytest
+from app.services import sequence_service
+from app.services.bulk_insert import queue_row_id
+from app.services.sequence_service import schedule_next_steps
+
+SENT_AT = datetime(2024, 5, 1, 9, 30)
+
+SEQUENCES = {
+    'seq-1': {
+        'id': 'seq-1',
+        'is_active': True,
+        'steps': [
+            {'step_title': 'Hi', 'content': 'Hello {first_name}', 'delay_days': 0},
+            {'step_title': 'Tips', 'content': 'Some tips', 'delay_days': 2},
+            {'step_title': 'Bye', 'content': 'Goodbye', 'delay_days': 5},
+        ]
+    },
+    'paused': {'id': 'paused', 'is_active': False, 'steps': [{'content': 'a'}, {'content': 'b'}]},
+}
+
+
+class FakeTemplates:
+    def __init__(self):
+        self.saved = []
+
+    def save(self, sequence_id, templates):
+        for template in templates:
+            template['version'] = f"v{template['step_number']}"
+        self.saved.append((sequence_id, [template['step_number'] for template in templates]))
+
+
+class FakeSuppression:
+    def __init__(self, suppressed=()):
+        self.suppressed = set(suppressed)
+
+    def is_suppressed(self, email):
+        return email in self.suppressed
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = {'rows': [], 'notified': [], 'templates': FakeTemplates()}
+
+    def get_sequence(sequence_id):
+        if sequence_id not in SEQUENCES:
+            raise Exception("Sequence not found")
+        return SEQUENCES[sequence_id]
+
+    def insert_in_chunks(table, rows, chunk_size=500):
+        rows = list(rows)
+        queue['rows'].extend(rows)
+        return len(rows)
+
+    monkeypatch.setattr(sequence_service, 'get_sequence', get_sequence)
+    monkeypatch.setattr(sequence_service, 'insert_in_chunks', insert_in_chunks)
+    monkeypatch.setattr(sequence_service, 'step_template_service', queue['templates'])
+    monkeypatch.setattr(sequence_service, 'suppression_index', FakeSuppression({'gone@example.com'}))
+    monkeypatch.setattr(sequence_service.email_service, 'notify_queued', queue['notified'].append)
+    return queue
+
+
+def _sent(sequence_id, step_number, email, sent_at=SENT_AT):
+    return {
+        'sequence_id': sequence_id,
+        'step_number': step_number,
+        'to_email': email,
+        'template_vars': {'first_name': email.split('@')[0]}
+    }, sent_at
+
+
+def test_next_step_is_due_after_the_actual_send_time(queue):
+    late = SENT_AT + timedelta(hours=6)
+    assert schedule_next_steps([_sent('seq-1', 1, 'ada@example.com'), _sent('seq-1', 2, 'ken@example.com', late)]) == 2
+
+    ada, ken = queue['rows']
+    assert ada['id'] == queue_row_id('seq-1', 2, 'ada@example.com')
+    assert (ada['step_number'], ada['template_version'], ada['schedule_next']) == (2, 'v2', True)
+    assert ada['scheduled_time'] == (SENT_AT + timedelta(days=2)).isoformat()
+    assert ada['template_vars'] == {'first_name': 'ada'}
+    # The last step does not schedule another one
+    assert (ken['step_number'], ken['schedule_next']) == (3, False)
+    assert ken['scheduled_time'] == (late + timedelta(days=5)).isoformat()
+
+    assert queue['templates'].saved == [('seq-1', [2, 3])]
+    assert queue['notified'] == [SENT_AT + timedelta(days=2)]
+
+
+def test_finished_suppressed_and_inactive_recipients_are_not_advanced(queue):
+    sent = [
+        _sent('seq-1', 3, 'ada@example.com'),
+        _sent('seq-1', 1, 'gone@example.com'),
+        _sent('paused', 1, 'ken@example.com'),
+        _sent('deleted', 1, 'grace@example.com'),
+    ]
+    assert schedule_next_steps(sent) == 0
+    assert queue['rows'] == [] and queue['templates'].saved == [] and queue['notified'] == []
+
+
+def test_sequences_are_loaded_once_per_batch(queue, monkeypatch):
+    loads = []
+    get_sequence = sequence_service.get_sequence
+
+    def counting_get_sequence(sequence_id):
+        loads.append(sequence_id)
+        return get_sequence(sequence_id)
+
+    monkeypatch.setattr(sequence_service, 'get_sequence', counting_get_sequence)
+    schedule_next_steps([_sent('seq-1', 1, f"user{i}@example.com") for i in range(5)])
+    assert loads == ['seq-1']
+    assert len(queue['rows']) == 5
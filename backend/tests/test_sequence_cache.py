@@ -0,0 +1,116 @@
+import pytest
+from app.services import sequence_cache as sequence_cache_module
+from app.services.sequence_cache import SequenceCache
+
+
+class Loader:
+    """Serves sequence rows from a dict, counting calls."""
+
+    def __init__(self, **rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, sequence_id):
+        self.calls.append(sequence_id)
+        row = self.rows.get(sequence_id)
+        return dict(row) if row else None
+
+
+def _row(sequence_id='s', title='Welcome', updated_at='2024-05-01T10:00:00'):
+    return {'id': sequence_id, 'title': title, 'steps': [{'content': 'Hi'}], 'updated_at': updated_at}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class DownRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError('redis is down')
+        return fail
+
+
+@pytest.fixture
+def local(monkeypatch):
+    monkeypatch.setattr(sequence_cache_module, 'get_shared_backend', lambda: None)
+
+
+def test_miss_loads_once_then_hits(local):
+    cache = SequenceCache()
+    loader = Loader(s=_row())
+    assert cache.get('s', loader)['title'] == 'Welcome'
+    assert cache.get('s', loader)['title'] == 'Welcome'
+    assert loader.calls == ['s']
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_missing_sequence_is_not_cached(local):
+    cache = SequenceCache()
+    loader = Loader()
+    assert cache.get('s', loader) is None
+    assert cache.get('s', loader) is None
+    assert loader.calls == ['s', 's']
+
+
+def test_callers_get_copies(local):
+    cache = SequenceCache()
+    loader = Loader(s=_row())
+    cache.get('s', loader)['steps'][0]['content'] = 'changed'
+    assert cache.get('s', loader)['steps'][0]['content'] == 'Hi'
+
+
+def test_writes_replace_and_invalidate(local):
+    cache = SequenceCache()
+    loader = Loader(s=_row())
+    cache.get('s', loader)
+    cache.set(_row(title='Renamed', updated_at='2024-05-02T10:00:00'))
+    assert cache.get('s', loader)['title'] == 'Renamed'
+    cache.invalidate('s')
+    assert cache.get('s', loader)['title'] == 'Welcome'
+    assert loader.calls == ['s', 's']
+
+
+def test_older_version_never_overwrites_a_newer_one(local):
+    cache = SequenceCache()
+    cache.set(_row(title='New', updated_at='2024-05-02T10:00:00'))
+    # A slow read that started before the write finishes afterwards
+    cache.set(_row(title='Old', updated_at='2024-05-01T10:00:00'))
+    assert cache.get('s', Loader())['title'] == 'New'
+
+
+def test_shared_backend_invalidates_every_worker(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(sequence_cache_module, 'get_shared_backend', lambda: redis)
+    first, second = SequenceCache(), SequenceCache()
+    loader = Loader(s=_row())
+    first.get('s', loader)
+    assert second.get('s', loader)['title'] == 'Welcome'
+    assert loader.calls == ['s']
+
+    second.set(_row(title='Renamed', updated_at='2024-05-02T10:00:00'))
+    assert first.get('s', loader)['title'] == 'Renamed'
+    first.invalidate('s')
+    second.get('s', loader)
+    assert loader.calls == ['s', 's']
+    assert second.stats()['backend'] == 'shared'
+
+
+def test_unreachable_shared_backend_reads_the_database(monkeypatch):
+    monkeypatch.setattr(sequence_cache_module, 'get_shared_backend', lambda: DownRedis())
+    cache = SequenceCache()
+    loader = Loader(s=_row())
+    assert cache.get('s', loader)['title'] == 'Welcome'
+    assert cache.get('s', loader)['title'] == 'Welcome'
+    cache.invalidate('s')
+    assert loader.calls == ['s', 's']
@@ -0,0 +1,33 @@
+import base64
+import json
+import uuid
+import pytest
+from app.services.sequence_service import _encode_cursor, _decode_cursor
+
+
+def test_cursor_round_trip():
+    sequence_id = str(uuid.uuid4())
+    cursor = _encode_cursor('2024-05-01T10:00:00.123456+00:00', sequence_id)
+    assert _decode_cursor(cursor) == ('2024-05-01T10:00:00.123456+00:00', sequence_id)
+
+
+def test_cursor_accepts_utc_suffix():
+    sequence_id = str(uuid.uuid4())
+    assert _decode_cursor(_encode_cursor('2024-05-01T10:00:00Z', sequence_id))[0] == '2024-05-01T10:00:00+00:00'
+
+
+@pytest.mark.parametrize('created_at, sequence_id', [
+    ('2024-05-01",id.gt.0,title.eq."x', str(uuid.uuid4())),
+    ('not a date', str(uuid.uuid4())),
+    ('2024-05-01T10:00:00+00:00', '1),or(id.gt.0'),
+])
+def test_cursor_rejects_tampered_values(created_at, sequence_id):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        _decode_cursor(_encode_cursor(created_at, sequence_id))
+
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        _decode_cursor('not-base64!')
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        _decode_cursor(base64.urlsafe_b64encode(json.dumps(['only one']).encode()).decode())
@@ -0,0 +1,62 @@
+import pytest
+from app.services.sequence_service import apply_sequence_operations
+
+
+def _sequence():
+    return {
+        'title': 'Welcome',
+        'description': 'Onboarding',
+        'steps': [
+            {'step_number': 1, 'type': 'email', 'step_title': 'Hi', 'content': 'Hello {first_name}', 'delay_days': 0},
+            {'step_number': 2, 'type': 'email', 'step_title': 'Tips', 'content': 'Some tips', 'delay_days': 2},
+            {'step_number': 3, 'type': 'email', 'step_title': 'Bye', 'content': 'Goodbye', 'delay_days': 5},
+        ]
+    }
+
+
+def test_set_delay_changes_only_steps():
+    sequence = _sequence()
+    changes = apply_sequence_operations(sequence, [{'op': 'set_delay', 'step_number': 2, 'delay_days': 3}])
+    assert list(changes) == ['steps']
+    assert changes['steps'][1]['delay_days'] == 3
+    # The input is not mutated
+    assert sequence['steps'][1]['delay_days'] == 2
+
+
+def test_unchanged_title_is_not_reported():
+    changes = apply_sequence_operations(_sequence(), [
+        {'op': 'set_title', 'value': 'Welcome'},
+        {'op': 'set_description', 'value': 'New description'}
+    ])
+    assert changes == {'description': 'New description'}
+
+
+def test_insert_and_remove_renumber_steps():
+    changes = apply_sequence_operations(_sequence(), [
+        {'op': 'insert_step', 'step_number': 2, 'content': 'Check in', 'step_title': 'Check', 'delay_days': 1},
+        {'op': 'remove_step', 'step_number': 4}
+    ])
+    steps = changes['steps']
+    assert [step['step_title'] for step in steps] == ['Hi', 'Check', 'Tips']
+    assert [step['step_number'] for step in steps] == [1, 2, 3]
+
+
+def test_insert_without_position_appends():
+    changes = apply_sequence_operations(_sequence(), [{'op': 'insert_step', 'content': 'Last'}])
+    assert changes['steps'][-1] == {
+        'step_number': 4, 'type': 'email', 'step_title': '', 'content': 'Last', 'delay_days': 1
+    }
+
+
+def test_no_op_patch_returns_no_changes():
+    changes = apply_sequence_operations(_sequence(), [{'op': 'replace_content', 'step_number': 3, 'content': 'Goodbye'}])
+    assert changes == {}
+
+
+@pytest.mark.parametrize('operation, message', [
+    ({'op': 'rewrite_everything'}, 'Unknown operation'),
+    ({'op': 'set_delay', 'step_number': 9, 'delay_days': 1}, 'Step 9 not found'),
+])
+def test_invalid_operations_raise(operation, message):
+    with pytest.raises(ValueError, match=message):
+        apply_sequence_operations(_sequence(), [operation])
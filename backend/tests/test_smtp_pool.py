@@ -0,0 +1,134 @@
+import smtplib
+import pytest
+from app.services import smtp_pool
+from app.services.smtp_pool import SMTPConnectionPool
+
+SETTINGS = {'smtp_host': 'smtp.test', 'smtp_port': 587, 'smtp_username': 'user', 'smtp_password': 'secret'}
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP and records every session it opens."""
+
+    instances = []
+    # Errors raised by the next send_message calls, in order
+    send_errors = []
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sent = []
+        self.closed = False
+        self.logged_in = False
+        self.resets = 0
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        self.logged_in = (username, password) == ('user', 'secret')
+
+    def noop(self):
+        return 250, b'OK'
+
+    def rset(self):
+        self.resets += 1
+        return 250, b'OK'
+
+    def send_message(self, msg):
+        if FakeSMTP.send_errors:
+            raise FakeSMTP.send_errors.pop(0)
+        self.sent.append(msg)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.send_errors = []
+    monkeypatch.setattr(smtp_pool.smtplib, 'SMTP', FakeSMTP)
+
+
+def test_connections_are_reused():
+    pool = SMTPConnectionPool(SETTINGS)
+    for i in range(3):
+        pool.send_message(f"message {i}")
+    assert len(FakeSMTP.instances) == 1
+    assert FakeSMTP.instances[0].logged_in
+    assert FakeSMTP.instances[0].sent == ['message 0', 'message 1', 'message 2']
+
+
+def test_connection_retired_after_message_cap():
+    pool = SMTPConnectionPool(SETTINGS, max_messages_per_connection=2)
+    for i in range(3):
+        pool.send_message(f"message {i}")
+    first, second = FakeSMTP.instances
+    assert first.closed and len(first.sent) == 2
+    assert second.sent == ['message 2']
+
+
+def test_idle_connection_is_replaced():
+    pool = SMTPConnectionPool(SETTINGS, idle_timeout=0)
+    pool.send_message('first')
+    pool.send_message('second')
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+
+
+def test_reconnects_after_transient_failure():
+    FakeSMTP.send_errors = [smtplib.SMTPServerDisconnected('gone')]
+    pool = SMTPConnectionPool(SETTINGS)
+    pool.send_message('hello')
+    broken, fresh = FakeSMTP.instances
+    assert broken.closed
+    assert fresh.sent == ['hello']
+
+
+def test_retries_421_but_not_permanent_errors():
+    FakeSMTP.send_errors = [smtplib.SMTPResponseException(421, b'try later')]
+    pool = SMTPConnectionPool(SETTINGS)
+    pool.send_message('hello')
+    assert FakeSMTP.instances[-1].sent == ['hello']
+
+    FakeSMTP.send_errors = [smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no such user')})]
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message('bounced')
+
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no such user')}),
+    smtplib.SMTPDataError(554, b'message rejected'),
+])
+def test_per_message_errors_keep_the_session(error):
+    FakeSMTP.send_errors = [error]
+    pool = SMTPConnectionPool(SETTINGS)
+    with pytest.raises(type(error)):
+        pool.send_message('bounced')
+    pool.send_message('next')
+    assert len(FakeSMTP.instances) == 1
+    session = FakeSMTP.instances[0]
+    assert not session.closed and session.resets == 1
+    assert session.sent == ['next']
+
+
+def test_421_discards_the_session():
+    FakeSMTP.send_errors = [smtplib.SMTPResponseException(421, b'closing')]
+    pool = SMTPConnectionPool(SETTINGS, max_size=1)
+    pool.send_message('hello')
+    closing, fresh = FakeSMTP.instances
+    assert closing.closed and closing.resets == 0
+    assert fresh.sent == ['hello']
+
+
+def test_checkout_times_out_when_pool_is_exhausted():
+    pool = SMTPConnectionPool(SETTINGS, max_size=1, acquire_timeout=0.01)
+    with pool.connection():
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    assert pool.ping()
@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+import pytest
+from app.services import suppression_index as suppression_module
+from app.services.suppression_index import SuppressionIndex, SUPPRESSED, PAUSED
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.bounds = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(('eq', column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(('gte', column, value))
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def upsert(self, row, on_conflict=None, ignore_duplicates=False):
+        self.db.tables[self.table].append(row)
+        return self
+
+    def execute(self):
+        self.db.queries.append((self.table, self.filters))
+        rows = [
+            row for row in self.db.tables[self.table]
+            if all(row.get(column) == value for op, column, value in self.filters if op == 'eq')
+        ]
+        if any(op == 'gte' for op, _, _ in self.filters):
+            rows = [row for row in rows if row.get('changed')]
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1] + 1]
+        return SimpleNamespace(data=rows)
+
+
+class FakeSupabase:
+    def __init__(self, sequences=(), suppressions=()):
+        self.tables = {'sequences': list(sequences), 'email_suppressions': list(suppressions)}
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeSupabase(
+        sequences=[
+            {'id': 'draft', 'status': 'DRAFT', 'is_active': False},
+            {'id': 'running', 'status': 'ACTIVE', 'is_active': True},
+            {'id': 'paused', 'status': 'ACTIVE', 'is_active': False},
+        ],
+        suppressions=[{'email': 'Bounced@Example.com'}]
+    )
+    monkeypatch.setattr(suppression_module, 'supabase', db)
+    return db
+
+
+def test_first_load_only_reads_paused_sequences(db):
+    index = SuppressionIndex(page_size=2)
+    index.refresh(force=True)
+    assert ('sequences', [('eq', 'status', 'ACTIVE'), ('eq', 'is_active', False)]) in db.queries
+    assert index.is_paused('paused')
+    assert not index.is_paused('draft') and not index.is_paused('running')
+    assert index.is_suppressed('bounced@example.com')
+
+
+def test_screen(db):
+    index = SuppressionIndex()
+    index.refresh(force=True)
+    assert index.screen({'to_email': 'BOUNCED@example.com', 'sequence_id': 'running'}) == SUPPRESSED
+    assert index.screen({'to_email': 'ada@example.com', 'sequence_id': 'paused'}) == PAUSED
+    assert index.screen({'to_email': 'ada@example.com', 'sequence_id': 'running'}) is None
+
+
+def test_incremental_refresh_applies_resumes_and_pauses(db):
+    index = SuppressionIndex()
+    index.refresh(force=True)
+    db.tables['sequences'] = [
+        {'id': 'paused', 'status': 'ACTIVE', 'is_active': True, 'changed': True},
+        {'id': 'running', 'status': 'ACTIVE', 'is_active': False, 'changed': True},
+        {'id': 'draft', 'status': 'DRAFT', 'is_active': False},
+    ]
+    db.tables['email_suppressions'].append({'email': 'gone@example.com', 'changed': True})
+    index.refresh(force=True)
+    assert index._paused == {'running'}
+    assert index.is_suppressed('gone@example.com') and index.is_suppressed('bounced@example.com')
+    assert db.queries[-1][1][0][:2] == ('gte', 'updated_at')
+
+
+def test_refresh_is_throttled_and_survives_errors(db, monkeypatch):
+    index = SuppressionIndex(refresh_interval=60)
+    index.refresh()
+    count = len(db.queries)
+    index.refresh()
+    assert len(db.queries) == count
+
+    def failing_table(name):
+        raise RuntimeError('connection refused')
+
+    monkeypatch.setattr(db, 'table', failing_table)
+    index.refresh(force=True)
+    # The index keeps what it had
+    assert index.is_paused('paused') and index.is_suppressed('bounced@example.com')
+
+
+def test_local_updates_apply_without_refresh(db):
+    index = SuppressionIndex()
+    index.track_sequence({'id': 'seq', 'status': 'ACTIVE', 'is_active': False})
+    assert index.is_paused('seq')
+    index.track_sequence({'id': 'seq', 'status': 'ACTIVE', 'is_active': True})
+    assert not index.is_paused('seq')
+    index.track_sequence({'id': 'seq', 'status': 'ACTIVE', 'is_active': False})
+    index.forget_sequence('seq')
+    assert index._paused == set()
+    # A draft going back from a failed publish is not tracked
+    index.track_sequence({'id': 'draft', 'status': 'DRAFT', 'is_active': False})
+    assert not index.is_paused('draft')
+
+
+def test_suppress_is_local_and_shared(db):
+    index = SuppressionIndex()
+    index.suppress(' Ada@Example.com ', reason='unsubscribed')
+    assert index.is_suppressed('ada@example.com')
+    assert db.tables['email_suppressions'][-1]['email'] == 'ada@example.com'
@@ -0,0 +1,31 @@
+from app.utils.templates import TemplateCache, compile_template, render
+
+
+def test_render_fills_placeholders():
+    assert render('Hi {first_name} from {location}!', {'first_name': 'Ada', 'location': 'London'}) == 'Hi Ada from London!'
+
+
+def test_missing_values_keep_placeholder():
+    assert render('Hi {first_name}, {title}', {'first_name': 'Ada'}) == 'Hi Ada, {title}'
+
+
+def test_unknown_placeholders_are_literal():
+    template = compile_template('Dear {first_name}, your {plan} renews')
+    assert template.slots == ('first_name',)
+    assert template.unknown_placeholders == ('plan',)
+    assert template.render({'first_name': 'Ada', 'plan': 'pro'}) == 'Dear Ada, your {plan} renews'
+
+
+def test_values_are_not_reinterpreted():
+    assert render('{first_name} {last_name}', {'first_name': '{last_name}', 'last_name': 'L'}) == '{last_name} L'
+
+
+def test_cache_compiles_once_and_evicts_least_recently_used():
+    cache = TemplateCache(max_size=2)
+    first = cache.get('a {email}')
+    assert cache.get('a {email}') is first
+    cache.get('b {email}')
+    cache.get('a {email}')
+    cache.get('c {email}')
+    assert cache.get('a {email}') is first
+    assert len(cache._templates) == 2